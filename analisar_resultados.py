@@ -6,39 +6,68 @@ Script para analisar os resultados do processamento
 import pandas as pd
 from datetime import datetime
 import os
+import sys
 
-def analisar_resultados():
+from particionamento import ARQUIVO_MANIFESTO, carregar_particoes, ler_manifesto
+
+def carregar_resultados(caminho, particoes=None):
+    """
+    Carrega um CSV de resultados ou, para um diretório particionado,
+    apenas as partições pedidas (ex: ['SP', 'RJ']), conferindo os checksums
+    """
+    if os.path.isdir(caminho):
+        manifesto = ler_manifesto(caminho)
+        print(f"Partições por {manifesto['criterio']}: {len(manifesto['particoes'])} "
+              f"({manifesto['total_linhas']} linhas no total)")
+        if particoes:
+            print(f"Lendo apenas: {', '.join(particoes)}")
+        return carregar_particoes(caminho, particoes)
+    return pd.read_csv(caminho)
+
+def analisar_resultados(caminho=None, particoes=None):
     """Analisa os resultados do processamento"""
     print("=== ANÁLISE DOS RESULTADOS DO PROCESSAMENTO ===")
     
-    # Encontra o arquivo de resultado mais recente
-    arquivos_resultado = [f for f in os.listdir('.') if f.startswith('resultados_cnpj_') and f.endswith('.csv')]
-    if not arquivos_resultado:
-        print("Nenhum arquivo de resultado encontrado!")
-        return
-    
-    arquivo_mais_recente = max(arquivos_resultado, key=lambda f: os.path.getmtime(f))
-    print(f"Analisando arquivo: {arquivo_mais_recente}")
+    if caminho is None:
+        # Encontra o resultado mais recente (CSV único ou diretório particionado)
+        arquivos_resultado = [
+            f for f in os.listdir('.') if f.startswith('resultados_cnpj_') and (
+                f.endswith('.csv') or os.path.isfile(os.path.join(f, ARQUIVO_MANIFESTO)))
+        ]
+        if not arquivos_resultado:
+            print("Nenhum arquivo de resultado encontrado!")
+            return
+        caminho = max(arquivos_resultado, key=lambda f: os.path.getmtime(f))
+    print(f"Analisando arquivo: {caminho}")
     
     # Carrega os dados
-    df = pd.read_csv(arquivo_mais_recente)
+    try:
+        df = carregar_resultados(caminho, particoes)
+    except (OSError, ValueError) as e:
+        print(f"Erro ao carregar os resultados: {str(e)}")
+        return
     
     print(f"\n=== ESTATÍSTICAS GERAIS ===")
     print(f"Total de CNPJs processados: {len(df)}")
     
     # Conta por status
     consultas_realizadas = len(df[df['consulta_realizada'] == True])
-    cnpjs_invalidos = len(df[df['motivo_falha'] == 'CNPJ inválido - não possui 14 dígitos'])
+    motivos = df['motivo_falha'].fillna('').astype(str)
+    cnpjs_invalidos = len(df[motivos.str.startswith('CNPJ inválido')])
+    nao_encontrados = len(df[motivos.str.startswith('CNPJ não encontrado')])
+    nao_encontrados_cache = len(df[motivos.str.endswith('(cache)')])
     erros_api = len(df[df['motivo_falha'] == 'Erro na API ou rate limit'])
     acronyms_encontrados = len(df[df['acronym'].notna() & (df['acronym'] != '')])
     
     print(f"✅ Consultas realizadas com sucesso: {consultas_realizadas}")
     print(f"⚠️  CNPJs inválidos (pulados): {cnpjs_invalidos}")
+    print(f"🔎 CNPJs não encontrados: {nao_encontrados}")
     print(f"❌ Erros de API/rate limit: {erros_api}")
+    print(f"🗃️  Respondidos pelo cache negativo: {nao_encontrados_cache}")
     print(f"🏷️  Acronyms encontrados: {acronyms_encontrados}")
     
     print(f"\n=== VERIFICAÇÃO ===")
-    soma_verificacao = consultas_realizadas + cnpjs_invalidos + erros_api
+    soma_verificacao = consultas_realizadas + cnpjs_invalidos + nao_encontrados + erros_api
     print(f"Soma das categorias: {soma_verificacao}")
     print(f"Total esperado: {len(df)}")
     print(f"✅ Processamento completo: {'SIM' if soma_verificacao == len(df) else 'NÃO'}")
@@ -66,7 +95,7 @@ def analisar_resultados():
         print(f"  ❌ {row['cnpj_original']}: Rate limit")
     
     print("\nCNPJs inválidos (primeiros 5):")
-    invalidos = df[df['motivo_falha'] == 'CNPJ inválido - não possui 14 dígitos'].head(5)
+    invalidos = df[motivos.str.startswith('CNPJ inválido')].head(5)
     for _, row in invalidos.iterrows():
         cnpj_limpo_str = str(row['cnpj_limpo'])
         print(f"  ⚠️  {row['cnpj_original']}: Inválido ({len(cnpj_limpo_str)} dígitos)")
@@ -79,4 +108,5 @@ def analisar_resultados():
     print(f"🎯 Taxa de sucesso nas consultas válidas: {consultas_realizadas}/{consultas_realizadas + erros_api} ({(consultas_realizadas/(consultas_realizadas + erros_api)*100):.1f}%)")
 
 if __name__ == "__main__":
-    analisar_resultados()
+    # Uso: python analisar_resultados.py [arquivo.csv | diretório particionado [partições...]]
+    analisar_resultados(sys.argv[1] if len(sys.argv) > 1 else None, sys.argv[2:] or None)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Arquivo de auditoria das respostas brutas da Brasil API
+Cada payload é endereçado pelo conteúdo (SHA-256 do JSON canônico), comprimido
+com zstd usando um dicionário treinado com as primeiras respostas e gravado em
+um único arquivo de dados. Um índice SQLite associa CNPJ e data da consulta ao
+payload, permitindo leitura aleatória e exportação em massa.
+Sem o pacote opcional 'zstandard', usa zlib com dicionário pré-definido (zdict).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional
+    zstandard = None
+
+# O zlib só aproveita os últimos 32 KB do dicionário (tamanho da janela)
+TAMANHO_MAXIMO_ZDICT = 32 * 1024
+
+
+class ArquivoPayloads:
+    """
+    Armazena respostas JSON comprimidas e deduplicadas por conteúdo
+    """
+
+    def __init__(self, diretorio: str = 'payloads_cnpj', amostras_para_treino: int = 1000,
+                 tamanho_dicionario: int = 64 * 1024, nivel: int = 9):
+        self.diretorio = diretorio
+        self.amostras_para_treino = amostras_para_treino
+        self.tamanho_dicionario = tamanho_dicionario
+        self.nivel = nivel
+        self.codec = 'zstd' if zstandard is not None else 'zlib'
+
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.RLock()
+        self._dados = open(os.path.join(diretorio, 'dados.bin'), 'a+b')
+        self._conexao = sqlite3.connect(os.path.join(diretorio, 'indice.db'),
+                                        check_same_thread=False)
+        self._conexao.executescript(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " hash TEXT PRIMARY KEY,"
+            " posicao INTEGER NOT NULL,"
+            " tamanho INTEGER NOT NULL,"
+            " codec TEXT NOT NULL,"
+            " dicionario INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS consultas ("
+            " cnpj TEXT NOT NULL,"
+            " obtido_em REAL NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " PRIMARY KEY (cnpj, obtido_em));"
+            "CREATE TABLE IF NOT EXISTS dicionarios ("
+            " id INTEGER PRIMARY KEY,"
+            " codec TEXT NOT NULL,"
+            " conteudo BLOB NOT NULL);"
+        )
+        self._conexao.commit()
+
+        self._dicionarios = {}
+        self._compressores = {}
+        self._descompressores = {}
+        self._dicionario_atual = self._carregar_dicionario_atual()
+        self._amostras = []
+
+    # ------------------------------------------------------------------
+    # Dicionários e compressão
+    # ------------------------------------------------------------------
+
+    def _carregar_dicionario_atual(self) -> int:
+        """Retorna o id do dicionário mais recente do codec em uso (0 = nenhum)"""
+        linha = self._conexao.execute(
+            "SELECT MAX(id) FROM dicionarios WHERE codec = ?", (self.codec,)
+        ).fetchone()
+        return linha[0] or 0
+
+    def _obter_dicionario(self, dicionario_id: int) -> bytes:
+        if dicionario_id not in self._dicionarios:
+            linha = self._conexao.execute(
+                "SELECT conteudo FROM dicionarios WHERE id = ?", (dicionario_id,)
+            ).fetchone()
+            self._dicionarios[dicionario_id] = bytes(linha[0])
+        return self._dicionarios[dicionario_id]
+
+    def _treinar_dicionario(self):
+        """Treina um dicionário com as amostras acumuladas e passa a usá-lo"""
+        if zstandard is not None:
+            conteudo = zstandard.train_dictionary(self.tamanho_dicionario, self._amostras).as_bytes()
+        else:
+            # Para o zlib, o dicionário é um trecho representativo: as strings mais
+            # frequentes devem ficar no final, então as amostras mais recentes vão por último
+            conteudo = b''.join(self._amostras)[-TAMANHO_MAXIMO_ZDICT:]
+
+        cursor = self._conexao.execute(
+            "INSERT INTO dicionarios (codec, conteudo) VALUES (?, ?)", (self.codec, conteudo)
+        )
+        self._dicionario_atual = cursor.lastrowid
+        self._amostras = []
+
+    def _comprimir(self, conteudo: bytes, dicionario_id: int) -> bytes:
+        if self.codec == 'zstd':
+            if dicionario_id not in self._compressores:
+                dicionario = None
+                if dicionario_id:
+                    dicionario = zstandard.ZstdCompressionDict(self._obter_dicionario(dicionario_id))
+                self._compressores[dicionario_id] = zstandard.ZstdCompressor(
+                    level=self.nivel, dict_data=dicionario
+                )
+            return self._compressores[dicionario_id].compress(conteudo)
+
+        if dicionario_id:
+            compressor = zlib.compressobj(self.nivel, zdict=self._obter_dicionario(dicionario_id))
+        else:
+            compressor = zlib.compressobj(self.nivel)
+        return compressor.compress(conteudo) + compressor.flush()
+
+    def _descomprimir(self, bloco: bytes, codec: str, dicionario_id: int) -> bytes:
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("Payload comprimido com zstd: instale o pacote 'zstandard'")
+            if dicionario_id not in self._descompressores:
+                dicionario = None
+                if dicionario_id:
+                    dicionario = zstandard.ZstdCompressionDict(self._obter_dicionario(dicionario_id))
+                self._descompressores[dicionario_id] = zstandard.ZstdDecompressor(dict_data=dicionario)
+            return self._descompressores[dicionario_id].decompress(bloco)
+
+        if dicionario_id:
+            descompressor = zlib.decompressobj(zdict=self._obter_dicionario(dicionario_id))
+        else:
+            descompressor = zlib.decompressobj()
+        return descompressor.decompress(bloco) + descompressor.flush()
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def gravar(self, cnpj: str, dados: Dict, obtido_em: Optional[float] = None) -> str:
+        """
+        Arquiva a resposta de um CNPJ e retorna o hash do conteúdo
+        Respostas idênticas são gravadas uma única vez
+        """
+        conteudo = json.dumps(dados, ensure_ascii=False, sort_keys=True,
+                              separators=(',', ':')).encode('utf-8')
+        hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+        obtido_em = time.time() if obtido_em is None else obtido_em
+
+        with self._lock:
+            existe = self._conexao.execute(
+                "SELECT 1 FROM blobs WHERE hash = ?", (hash_conteudo,)
+            ).fetchone()
+
+            if not existe:
+                dicionario_id = self._dicionario_atual
+                bloco = self._comprimir(conteudo, dicionario_id)
+                # Em modo append a escrita vai sempre para o fim real do arquivo; a posição é
+                # lida depois da escrita porque outros processos gravam no mesmo dados.bin
+                self._dados.write(bloco)
+                self._dados.flush()
+                posicao = self._dados.tell() - len(bloco)
+                self._conexao.execute(
+                    "INSERT INTO blobs (hash, posicao, tamanho, codec, dicionario) VALUES (?, ?, ?, ?, ?)",
+                    (hash_conteudo, posicao, len(bloco), self.codec, dicionario_id)
+                )
+
+                if not self._dicionario_atual:
+                    self._amostras.append(conteudo)
+                    if len(self._amostras) >= self.amostras_para_treino:
+                        self._treinar_dicionario()
+
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO consultas (cnpj, obtido_em, hash) VALUES (?, ?, ?)",
+                (cnpj, obtido_em, hash_conteudo)
+            )
+            self._conexao.commit()
+
+        return hash_conteudo
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def _ler_blob(self, posicao: int, tamanho: int, codec: str, dicionario_id: int) -> Dict:
+        self._dados.seek(posicao)
+        bloco = self._dados.read(tamanho)
+        return json.loads(self._descomprimir(bloco, codec, dicionario_id))
+
+    def ler(self, cnpj: str, obtido_em: Optional[float] = None) -> Optional[Dict]:
+        """
+        Retorna o payload mais recente do CNPJ (ou o mais recente até obtido_em)
+        """
+        limite = time.time() if obtido_em is None else obtido_em
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT b.posicao, b.tamanho, b.codec, b.dicionario"
+                " FROM consultas c JOIN blobs b ON b.hash = c.hash"
+                " WHERE c.cnpj = ? AND c.obtido_em <= ?"
+                " ORDER BY c.obtido_em DESC LIMIT 1",
+                (cnpj, limite)
+            ).fetchone()
+            if linha is None:
+                return None
+            return self._ler_blob(*linha)
+
+    def historico(self, cnpj: str) -> List[Tuple[float, Dict]]:
+        """Retorna todas as versões arquivadas do CNPJ como (obtido_em, dados)"""
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT c.obtido_em, b.posicao, b.tamanho, b.codec, b.dicionario"
+                " FROM consultas c JOIN blobs b ON b.hash = c.hash"
+                " WHERE c.cnpj = ? ORDER BY c.obtido_em",
+                (cnpj,)
+            ).fetchall()
+            return [(linha[0], self._ler_blob(*linha[1:])) for linha in linhas]
+
+    def iterar(self) -> Iterator[Tuple[str, float, Dict]]:
+        """
+        Itera sobre todas as consultas arquivadas como (cnpj, obtido_em, dados)
+        A leitura segue a ordem física do arquivo de dados (leitura sequencial)
+        """
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT c.cnpj, c.obtido_em, b.posicao, b.tamanho, b.codec, b.dicionario"
+                " FROM consultas c JOIN blobs b ON b.hash = c.hash"
+                " ORDER BY b.posicao"
+            )
+            while True:
+                lote = linhas.fetchmany(1000)
+                if not lote:
+                    return
+                for linha in lote:
+                    yield linha[0], linha[1], self._ler_blob(*linha[2:])
+
+    def exportar_jsonl(self, destino: str) -> int:
+        """Exporta todo o arquivo para JSON Lines e retorna a quantidade de registros"""
+        total = 0
+        with open(destino, 'w', encoding='utf-8') as f:
+            for cnpj, obtido_em, dados in self.iterar():
+                f.write(json.dumps({'cnpj': cnpj, 'obtido_em': obtido_em, 'dados': dados},
+                                   ensure_ascii=False))
+                f.write('\n')
+                total += 1
+        return total
+
+    def estatisticas(self) -> Dict:
+        """Resumo do arquivo: consultas, payloads distintos e bytes em disco"""
+        with self._lock:
+            consultas = self._conexao.execute("SELECT COUNT(*) FROM consultas").fetchone()[0]
+            blobs, tamanho = self._conexao.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM blobs"
+            ).fetchone()
+        return {
+            'consultas': consultas,
+            'payloads_distintos': blobs,
+            'bytes_comprimidos': tamanho,
+            'codec': self.codec,
+            'dicionario': self._dicionario_atual,
+        }
+
+    def fechar(self):
+        """Fecha o arquivo de dados e o índice"""
+        with self._lock:
+            self._dados.close()
+            self._conexao.close()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache local de respostas da Brasil API
+Guarda as consultas bem-sucedidas em SQLite para evitar gastar o rate limit
+com CNPJs já consultados. Um cache negativo separado, com validade menor,
+lembra CNPJs não encontrados ou inválidos. As descrições repetidas (CNAE,
+natureza jurídica, situação) são gravadas como códigos da tabela referencias.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from tabelas_referencia import DadosCompactos, TabelasReferencia
+
+# Limite seguro de parâmetros por consulta no SQLite
+TAMANHO_LOTE_SQL = 900
+
+# Entradas negativas gravadas antes de um commit (linhas inválidas não passam pelo rate limit)
+COMMIT_NEGATIVOS_A_CADA = 500
+
+
+class CacheCNPJ:
+    """
+    Cache persistente de respostas por CNPJ com validade configurável
+    Respostas de sucesso e negativas ficam em tabelas separadas
+    """
+
+    def __init__(self, arquivo: str = 'cache_cnpj.db', validade_dias: float = 30,
+                 validade_negativa_dias: float = 7):
+        self.arquivo = arquivo
+        self.validade_segundos = validade_dias * 86400
+        self.validade_negativa_segundos = validade_negativa_dias * 86400
+        self._negativos_pendentes = 0
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(arquivo, check_same_thread=False)
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS respostas ("
+            " cnpj TEXT PRIMARY KEY,"
+            " dados TEXT NOT NULL,"
+            " obtido_em REAL NOT NULL)"
+        )
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS negativos ("
+            " cnpj TEXT PRIMARY KEY,"
+            " motivo TEXT NOT NULL,"
+            " registrado_em REAL NOT NULL)"
+        )
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS referencias ("
+            " campo TEXT NOT NULL,"
+            " codigo INTEGER NOT NULL,"
+            " valor TEXT NOT NULL,"
+            " PRIMARY KEY (campo, codigo),"
+            " UNIQUE (campo, valor))"
+        )
+        # Limpa entradas de versões anteriores: negativos de valores sem 14 dígitos
+        # (nunca consultados) e CNPJs presentes nas duas tabelas
+        self._conexao.execute("DELETE FROM negativos WHERE length(cnpj) != 14")
+        self._conexao.execute("DELETE FROM negativos WHERE cnpj IN (SELECT cnpj FROM respostas)")
+        self._conexao.commit()
+        # Códigos atribuídos no banco valem para todos os processos que usam o cache
+        self.tabelas = TabelasReferencia(self._registrar_referencia, self._ler_referencias)
+
+    def _registrar_referencia(self, campo: str, valor: str) -> int:
+        """Atribui (ou recupera) no banco o código de um valor de referência"""
+        with self._lock:
+            # Um único INSERT ... SELECT: o próximo código é calculado e gravado atomicamente
+            self._conexao.execute(
+                "INSERT OR IGNORE INTO referencias (campo, codigo, valor)"
+                " SELECT ?, COALESCE(MAX(codigo) + 1, 0), ? FROM referencias WHERE campo = ?",
+                (campo, valor, campo)
+            )
+            codigo = self._conexao.execute(
+                "SELECT codigo FROM referencias WHERE campo = ? AND valor = ?", (campo, valor)
+            ).fetchone()[0]
+            self._conexao.commit()
+            self._negativos_pendentes = 0
+        return codigo
+
+    def _ler_referencias(self) -> List[Tuple[str, int, str]]:
+        """Lê todas as entradas das tabelas de referência"""
+        with self._lock:
+            return self._conexao.execute(
+                "SELECT campo, codigo, valor FROM referencias"
+            ).fetchall()
+
+    def _limite_validade(self) -> float:
+        """Timestamp mínimo para que uma entrada ainda seja considerada válida"""
+        return time.time() - self.validade_segundos
+
+    def _limite_validade_negativa(self) -> float:
+        """Timestamp mínimo para que uma entrada negativa ainda seja considerada válida"""
+        return time.time() - self.validade_negativa_segundos
+
+    def obter(self, cnpj: str) -> Optional[DadosCompactos]:
+        """Retorna os dados em cache do CNPJ ou None se ausente/expirado"""
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT dados FROM respostas WHERE cnpj = ? AND obtido_em >= ?",
+                (cnpj, self._limite_validade())
+            ).fetchone()
+        return DadosCompactos(json.loads(linha[0]), self.tabelas) if linha else None
+
+    def salvar(self, cnpj: str, dados: Dict):
+        """Grava (ou substitui) a resposta de um CNPJ, com os campos de referência codificados"""
+        # Codifica antes de tomar o lock: códigos novos são gravados via _registrar_referencia
+        compactos = self.tabelas.compactar(dados).compactos()
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO respostas (cnpj, dados, obtido_em) VALUES (?, ?, ?)",
+                (cnpj, json.dumps(compactos, ensure_ascii=False, separators=(',', ':')), time.time())
+            )
+            # Uma resposta de sucesso invalida qualquer entrada negativa anterior
+            self._conexao.execute("DELETE FROM negativos WHERE cnpj = ?", (cnpj,))
+            self._conexao.commit()
+            self._negativos_pendentes = 0
+
+    def obter_negativo(self, cnpj: str) -> Optional[str]:
+        """Retorna o motivo registrado no cache negativo ou None se ausente/expirado"""
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT motivo FROM negativos WHERE cnpj = ? AND registrado_em >= ?",
+                (cnpj, self._limite_validade_negativa())
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def salvar_negativo(self, cnpj: str, motivo: str):
+        """
+        Registra um CNPJ não encontrado ou com dígitos verificadores incorretos
+        Os commits são agrupados; use sincronizar() ao final de um lote
+        """
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO negativos (cnpj, motivo, registrado_em) VALUES (?, ?, ?)",
+                (cnpj, motivo, time.time())
+            )
+            # Uma entrada negativa substitui a resposta anterior (o CNPJ fica em uma só tabela)
+            self._conexao.execute("DELETE FROM respostas WHERE cnpj = ?", (cnpj,))
+            self._negativos_pendentes += 1
+            if self._negativos_pendentes >= COMMIT_NEGATIVOS_A_CADA:
+                self._conexao.commit()
+                self._negativos_pendentes = 0
+
+    def sincronizar(self):
+        """Grava no disco as entradas negativas pendentes"""
+        with self._lock:
+            self._conexao.commit()
+            self._negativos_pendentes = 0
+
+    def filtrar_presentes(self, cnpjs: Iterable[str]) -> Set[str]:
+        """
+        Retorna o subconjunto de CNPJs que possuem entrada válida no cache
+        As consultas são feitas em lotes para suportar milhões de CNPJs
+        """
+        return self._filtrar(cnpjs, "SELECT cnpj FROM respostas WHERE obtido_em >= ?",
+                             self._limite_validade())
+
+    def filtrar_atualizados(self, cnpjs: Iterable[str], idade_maxima_segundos: float) -> Set[str]:
+        """Retorna o subconjunto de CNPJs consultados há no máximo idade_maxima_segundos"""
+        limite = max(self._limite_validade(), time.time() - idade_maxima_segundos)
+        return self._filtrar(cnpjs, "SELECT cnpj FROM respostas WHERE obtido_em >= ?", limite)
+
+    def filtrar_negativos(self, cnpjs: Iterable[str]) -> Set[str]:
+        """Retorna o subconjunto de CNPJs com entrada válida no cache negativo"""
+        return self._filtrar(cnpjs, "SELECT cnpj FROM negativos WHERE registrado_em >= ?",
+                             self._limite_validade_negativa())
+
+    def _filtrar(self, cnpjs: Iterable[str], sql: str, limite: float) -> Set[str]:
+        presentes = set()
+        lote = []
+
+        for cnpj in cnpjs:
+            lote.append(cnpj)
+            if len(lote) >= TAMANHO_LOTE_SQL:
+                presentes.update(self._buscar_lote(sql, lote, limite))
+                lote = []
+        if lote:
+            presentes.update(self._buscar_lote(sql, lote, limite))
+
+        return presentes
+
+    def _buscar_lote(self, sql: str, lote: list, limite: float) -> Set[str]:
+        marcadores = ','.join('?' * len(lote))
+        with self._lock:
+            linhas = self._conexao.execute(
+                f"{sql} AND cnpj IN ({marcadores})", [limite, *lote]
+            ).fetchall()
+        return {linha[0] for linha in linhas}
+
+    def iterar(self) -> Iterator[Tuple[str, DadosCompactos]]:
+        """Itera sobre todas as respostas válidas do cache como (cnpj, dados)"""
+        with self._lock:
+            cursor = self._conexao.execute(
+                "SELECT cnpj, dados FROM respostas WHERE obtido_em >= ?",
+                (self._limite_validade(),)
+            )
+        while True:
+            with self._lock:
+                lote = cursor.fetchmany(TAMANHO_LOTE_SQL)
+            if not lote:
+                return
+            for cnpj, dados in lote:
+                yield cnpj, DadosCompactos(json.loads(dados), self.tabelas)
+
+    def fechar(self):
+        """Fecha a conexão com o banco do cache"""
+        with self._lock:
+            self._conexao.commit()
+            self._conexao.close()
@@ -4,20 +4,105 @@ import time
 import json
 import re
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
 import csv
 import os
+from operator import mul
+
+from arquivo_payloads import ArquivoPayloads
+from cache_cnpj import CacheCNPJ
+from enriquecimento import enriquecer_arquivo
+from eventos import RegistroEventos
+from indice_empresas import IndiceEmpresas
+from limitador import PRIORIDADE_LOTE, LimitadorCompartilhado
+from leitores import iterar_cnpjs
+from memoria_externa import OrdenadorExterno, ResultadosTemporarios, agrupar_por_raiz, deduplicar
+from particionamento import LINHAS_POR_PARTICAO, salvar_particionado
+from pipeline import PipelineConsulta
+from planejador import planejar_arquivo
+from quota_adaptativa import STATUS_LIMITE, ControladorQuota
+from tabelas_referencia import DadosCompactos, TabelasReferencia
+from transporte import TransporteHTTP
+
+# Colunas do CSV de resultados, na ordem em que são gravadas
+COLUNAS_RESULTADO = [
+    'cnpj_original', 'cnpj_limpo', 'consulta_realizada', 'acronym', 'motivo_falha',
+    'razao_social', 'nome_fantasia', 'situacao', 'porte', 'codigo_porte',
+    'natureza_juridica', 'cnae_fiscal', 'cnae_fiscal_descricao', 'telefone',
+    'telefone_2', 'email', 'cep', 'municipio', 'uf', 'logradouro', 'numero',
+    'bairro', 'complemento', 'capital_social', 'data_inicio_atividade',
+    'data_situacao_cadastral',
+]
+
+# Tentativas por CNPJ quando a API responde 429 (só com quota adaptativa)
+TENTATIVAS_LIMITE_EXCEDIDO = 3
+
+# Colunas de saída preenchidas a partir das tabelas de referência (coluna -> campo da API)
+COLUNAS_REFERENCIA = {
+    'situacao': 'descricao_situacao_cadastral',
+    'natureza_juridica': 'natureza_juridica',
+    'cnae_fiscal_descricao': 'cnae_fiscal_descricao',
+}
+
+# (pesos, ajuste de 48 * soma dos pesos para bytes ASCII) do primeiro e do segundo dígito
+_PESOS_DIGITOS = [
+    (pesos, 48 * sum(pesos))
+    for pesos in ((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+]
+
+# Byte ASCII do dígito verificador esperado para cada resto da divisão por 11
+_DIGITO_POR_RESTO = bytes(48 + (0 if resto < 2 else 11 - resto) for resto in range(11))
+
+def calcular_digitos_cnpj(base: str) -> str:
+    """Calcula os dois dígitos verificadores para os 12 primeiros dígitos do CNPJ"""
+    codigos = bytearray(base.encode('ascii'))
+    for pesos, ajuste in _PESOS_DIGITOS:
+        codigos.append(_DIGITO_POR_RESTO[(sum(map(mul, codigos, pesos)) - ajuste) % 11])
+    return codigos[12:].decode('ascii')
 
 class ConsultorCNPJA:
     """
     Classe para consultar informações de CNPJs através da Brasil API
-    com controle de rate limiting (5 consultas por minuto)
+    com controle de rate limiting (5 consultas por minuto ou quota adaptativa)
     """
     
-    def __init__(self):
+    MOTIVO_INVALIDO = 'CNPJ inválido - não possui 14 dígitos'
+    MOTIVO_DIGITOS = 'CNPJ inválido - dígitos verificadores incorretos'
+    MOTIVO_NAO_ENCONTRADO = 'CNPJ não encontrado'
+    MOTIVO_ERRO_API = 'Erro na API ou rate limit'
+    MOTIVO_NAO_CONSULTADO = 'Não consultado - processamento interrompido'
+    
+    def __init__(self, cache: Optional[CacheCNPJ] = None,
+                 arquivo_payloads: Optional[ArquivoPayloads] = None,
+                 indice: Optional[IndiceEmpresas] = None,
+                 transporte=None,
+                 limitador: Optional[LimitadorCompartilhado] = None,
+                 quota: Optional[ControladorQuota] = None):
         self.base_url = "https://brasilapi.com.br/api/cnpj/v1"
         self.rate_limit = 5  # 5 consultas por minuto
+        self.intervalo_consultas = 15  # segundos fixos entre consultas
+        # Com um ControladorQuota, a taxa é aprendida das respostas e substitui os limites fixos
+        self.quota = quota
         self.consultas_realizadas = []
+        self.cache = cache
+        # Descrições repetidas viram códigos; com cache, os códigos são os do banco do cache
+        self.tabelas = cache.tabelas if cache is not None else TabelasReferencia()
+        self.arquivo_payloads = arquivo_payloads  # auditoria das respostas brutas
+        self.indice = indice  # índices secundários para consultas por atributo
+        # HTTP real por padrão; veja transporte.py para gravação e reprodução
+        self.transporte = transporte if transporte is not None else TransporteHTTP()
+        # Quota compartilhada entre processos (menu, lotes e prefetch)
+        self.limitador = limitador
+        self.prioridade = PRIORIDADE_LOTE
+        self.prazo = None  # horário (time.time()) em que o lote atual deveria terminar
+        self._sessao_limitador = None
+        self.tamanho_fila = 100  # itens por fila do pipeline de processamento
+        # Eventos estruturados; nos lotes, as mensagens por linha só aparecem com verboso=True
+        self.eventos = RegistroEventos()
+        self.verboso = False
+        self.perfilador = None  # perfilador.Perfilador no modo --profile
+        # Evento de parada do lote (definido pelo pipeline): interrompe a espera do rate limit
+        self.parada = None
         
     def limpar_cnpj(self, cnpj: str) -> str:
         """Remove pontuação do CNPJ, mantendo apenas números"""
@@ -28,10 +113,54 @@ class ConsultorCNPJA:
         cnpj_limpo = self.limpar_cnpj(cnpj)
         return len(cnpj_limpo) == 14 and cnpj_limpo.isdigit()
     
-    def controlar_rate_limit(self):
-        """Controla o limite de 5 consultas por minuto com intervalo fixo de 15 segundos"""
+    def validar_digitos_cnpj(self, cnpj_limpo: str) -> bool:
+        """Confere os dois dígitos verificadores de um CNPJ com 14 dígitos"""
+        if (len(cnpj_limpo) != 14 or not cnpj_limpo.isascii() or not cnpj_limpo.isdigit()
+                or cnpj_limpo == cnpj_limpo[0] * 14):
+            return False
+        
+        # Trabalha sobre os bytes ASCII: cada dígito vale (byte - 48); sem laço, pois
+        # roda uma vez por CNPJ único no planejamento
+        codigos = cnpj_limpo.encode('ascii')
+        (pesos_1, ajuste_1), (pesos_2, ajuste_2) = _PESOS_DIGITOS
+        return (codigos[12] == _DIGITO_POR_RESTO[(sum(map(mul, codigos, pesos_1)) - ajuste_1) % 11]
+                and codigos[13] == _DIGITO_POR_RESTO[(sum(map(mul, codigos, pesos_2)) - ajuste_2) % 11])
+    
+    def normalizar_cnpj(self, cnpj) -> str:
+        """Limpa o CNPJ e restaura zeros à esquerda perdidos (ex: lidos como número)"""
+        cnpj_limpo = self.limpar_cnpj(str(cnpj).strip())
+        if cnpj_limpo.isdigit() and len(cnpj_limpo) < 14:
+            cnpj_limpo = cnpj_limpo.zfill(14)
+        return cnpj_limpo
+    
+    def intervalo_efetivo(self) -> float:
+        """Intervalo em segundos entre consultas, respeitando intervalo fixo e limite por minuto"""
+        if not self.transporte.respeita_rate_limit:
+            return 0.0
+        if self.quota is not None:
+            return self.quota.intervalo()
+        return max(self.intervalo_consultas, 60 / self.rate_limit)
+    
+    def controlar_rate_limit(self) -> bool:
+        """
+        Aguarda o intervalo entre consultas (fixo de 15 segundos ou o da quota adaptativa)
+        Retorna False se o lote foi interrompido durante a espera (a consulta não deve ser feita)
+        """
+        if self.limitador is not None:
+            if self._sessao_limitador is None:
+                self._sessao_limitador = self.limitador.nova_sessao()
+            espera = self.limitador.adquirir(self._sessao_limitador, self.prioridade,
+                                             self.intervalo_efetivo(), self.prazo, self.parada)
+            self._limpar_historico()
+            if espera is None:
+                return False
+            if espera >= 1:
+                self.eventos.debug('espera_quota', f"Aguardou {espera:.1f}s pela vez na quota compartilhada da API",
+                                   segundos=round(espera, 3))
+            return True
+        
         # Intervalo fixo de 15 segundos entre consultas (mais conservador que 12s)
-        intervalo_fixo = 15  # 15 segundos entre cada consulta
+        intervalo_fixo = self.intervalo_efetivo()
         
         if self.consultas_realizadas:
             ultima_consulta = self.consultas_realizadas[-1]
@@ -39,10 +168,18 @@ class ConsultorCNPJA:
             
             if tempo_desde_ultima < intervalo_fixo:
                 tempo_espera = intervalo_fixo - tempo_desde_ultima
-                print(f"Aguardando intervalo obrigatório de 15s entre consultas. Restam {tempo_espera:.1f} segundos...")
-                time.sleep(tempo_espera)
+                self.eventos.debug('espera_rate_limit', f"Aguardando intervalo obrigatório de {intervalo_fixo:.1f}s entre consultas. Restam {tempo_espera:.1f} segundos...",
+                                   segundos=round(tempo_espera, 3))
+                if self.parada is None:
+                    time.sleep(tempo_espera)
+                elif self.parada.wait(tempo_espera):
+                    return False
         
-        # Remove consultas antigas (mais de 1 minuto) para manter histórico limpo
+        self._limpar_historico()
+        return self.parada is None or not self.parada.is_set()
+    
+    def _limpar_historico(self):
+        """Remove consultas antigas (mais de 1 minuto) para manter histórico limpo"""
         agora = time.time()
         self.consultas_realizadas = [
             timestamp for timestamp in self.consultas_realizadas 
@@ -54,42 +191,157 @@ class ConsultorCNPJA:
         Consulta um CNPJ específico na Brasil API
         Retorna o objeto JSON completo ou None em caso de erro
         """
+        dados, _ = self.consultar_cnpj_detalhado(cnpj)
+        # A forma compacta (DadosCompactos) fica restrita aos resultados, ao cache e à escrita
+        return dict(dados) if dados is not None else None
+    
+    def definir_prazo(self, minutos: Optional[float]):
+        """Define o prazo do lote em minutos a partir de agora (None remove o prazo)"""
+        self.prazo = time.time() + minutos * 60 if minutos is not None else None
+    
+    def _avisar_prazo(self, total_cnpjs: int):
+        """Avisa quando o lote pode não terminar dentro do prazo definido"""
+        if self.prazo is None:
+            return
+        disponivel = self.prazo - time.time()
+        necessario = total_cnpjs * self.intervalo_efetivo()
+        concorrentes = 0
+        if self.limitador is not None:
+            concorrentes = sum(1 for sessao, prioridade, _ in self.limitador.sessoes_ativas()
+                               if prioridade <= self.prioridade and sessao != self._sessao_limitador)
+        if necessario > disponivel:
+            print(f"⚠ Até {total_cnpjs} consultas podem levar {necessario / 60:.1f} min, "
+                  f"mas o prazo termina em {max(disponivel, 0) / 60:.1f} min")
+        if concorrentes:
+            print(f"⚠ {concorrentes} outra(s) sessão(ões) de prioridade igual ou maior dividem a quota")
+    
+    def encerrar_sessao(self):
+        """Libera a sessão no limitador compartilhado (sessões de menor prioridade voltam a consultar)"""
+        if self.limitador is not None and self._sessao_limitador is not None:
+            self.limitador.encerrar_sessao(self._sessao_limitador)
+            self._sessao_limitador = None
+    
+    def consultar_cnpj_detalhado(self, cnpj: str,
+                                 forcar_atualizacao: bool = False) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Consulta um CNPJ e retorna (dados, motivo_falha)
+        CNPJs conhecidos como inexistentes ou inválidos são respondidos pelo
+        cache negativo, sem consumir o rate limit
+        Com forcar_atualizacao, ignora o cache e consulta a API (renovação do cache)
+        """
         cnpj_limpo = self.limpar_cnpj(cnpj)
         
         if not self.validar_cnpj(cnpj_limpo):
-            print(f"⚠ CNPJ inválido (não possui 14 dígitos), pulando: {cnpj} -> {cnpj_limpo}")
-            return None
+            self.eventos.aviso('cnpj_invalido', f"⚠ CNPJ inválido (não possui 14 dígitos), pulando: {cnpj} -> {cnpj_limpo}",
+                               cnpj=cnpj_limpo, motivo=self.MOTIVO_INVALIDO)
+            return None, self.MOTIVO_INVALIDO
+        
+        if self.cache is not None and self.transporte.usa_cache and not forcar_atualizacao:
+            motivo = self.cache.obter_negativo(cnpj_limpo)
+            if motivo is not None:
+                self.eventos.info('cache_negativo', f"✗ CNPJ no cache negativo ({motivo}): {cnpj_limpo}",
+                                  cnpj=cnpj_limpo, motivo=motivo)
+                return None, f"{motivo} (cache)"
+            
+            dados = self.cache.obter(cnpj_limpo)
+            if dados is not None:
+                self.eventos.info('cache_acerto', f"✓ CNPJ encontrado no cache: {cnpj_limpo}", cnpj=cnpj_limpo)
+                return dados, None
         
-        # Controla o rate limit
-        self.controlar_rate_limit()
+        if not self.validar_digitos_cnpj(cnpj_limpo):
+            self.eventos.aviso('cnpj_invalido', f"⚠ CNPJ inválido (dígitos verificadores incorretos), pulando: {cnpj_limpo}",
+                               cnpj=cnpj_limpo, motivo=self.MOTIVO_DIGITOS)
+            self._registrar_negativo(cnpj_limpo, self.MOTIVO_DIGITOS)
+            return None, self.MOTIVO_DIGITOS
         
         try:
             url = f"{self.base_url}/{cnpj_limpo}"
-            print(f"Consultando CNPJ: {cnpj_limpo}")
+            self.eventos.debug('consulta_iniciada', f"Consultando CNPJ: {cnpj_limpo}", cnpj=cnpj_limpo)
             
-            response = requests.get(url, timeout=30)
-            self.consultas_realizadas.append(time.time())
+            response, duracao_ms = self._requisitar(url, cnpj_limpo)
             
-            if response.status_code == 200:
+            if response is None:
+                return None, self.MOTIVO_NAO_CONSULTADO
+            elif response.status_code == 200:
                 dados = response.json()
-                print(f"✓ Consulta realizada com sucesso para CNPJ: {cnpj_limpo}")
-                return dados
+                self.eventos.info('consulta_api', f"✓ Consulta realizada com sucesso para CNPJ: {cnpj_limpo}",
+                                  cnpj=cnpj_limpo, status=200, duracao_ms=duracao_ms)
+                if self.arquivo_payloads is not None:
+                    self.arquivo_payloads.gravar(cnpj_limpo, dados)
+                # Daqui em diante o registro guarda só os códigos das descrições repetidas
+                dados = self.tabelas.compactar(dados)
+                if self.cache is not None:
+                    self.cache.salvar(cnpj_limpo, dados)
+                if self.indice is not None:
+                    self.indice.registrar(cnpj_limpo, dados)
+                return dados, None
             elif response.status_code == 404:
-                print(f"✗ CNPJ não encontrado: {cnpj_limpo}")
-                return None
+                self.eventos.info('nao_encontrado', f"✗ CNPJ não encontrado: {cnpj_limpo}",
+                                  cnpj=cnpj_limpo, status=404, duracao_ms=duracao_ms)
+                self._registrar_negativo(cnpj_limpo, self.MOTIVO_NAO_ENCONTRADO)
+                return None, self.MOTIVO_NAO_ENCONTRADO
             else:
-                print(f"✗ Erro na consulta do CNPJ {cnpj_limpo}: Status {response.status_code}")
-                return None
+                self.eventos.erro('erro_api', f"✗ Erro na consulta do CNPJ {cnpj_limpo}: Status {response.status_code}",
+                                  cnpj=cnpj_limpo, status=response.status_code, duracao_ms=duracao_ms)
+                return None, self.MOTIVO_ERRO_API
                 
         except requests.exceptions.Timeout:
-            print(f"✗ Timeout na consulta do CNPJ: {cnpj_limpo}")
-            return None
+            self.eventos.erro('erro_api', f"✗ Timeout na consulta do CNPJ: {cnpj_limpo}",
+                              cnpj=cnpj_limpo, erro='timeout')
+            return None, self.MOTIVO_ERRO_API
         except requests.exceptions.RequestException as e:
-            print(f"✗ Erro de conexão para CNPJ {cnpj_limpo}: {str(e)}")
-            return None
+            self.eventos.erro('erro_api', f"✗ Erro de conexão para CNPJ {cnpj_limpo}: {str(e)}",
+                              cnpj=cnpj_limpo, erro=str(e))
+            return None, self.MOTIVO_ERRO_API
         except json.JSONDecodeError:
-            print(f"✗ Erro ao decodificar JSON para CNPJ: {cnpj_limpo}")
-            return None
+            self.eventos.erro('erro_api', f"✗ Erro ao decodificar JSON para CNPJ: {cnpj_limpo}",
+                              cnpj=cnpj_limpo, erro='json_invalido')
+            return None, self.MOTIVO_ERRO_API
+    
+    def _requisitar(self, url: str, cnpj_limpo: str):
+        """
+        Faz a requisição respeitando o rate limit e retorna (resposta, duracao_ms)
+        Com quota adaptativa, cada resposta ajusta a taxa e um 429 é repetido na taxa reduzida
+        Retorna (None, 0.0) se o lote foi interrompido antes da requisição
+        """
+        tentativa = 1
+        while True:
+            # A reprodução de gravações não consome quota
+            if self.transporte.respeita_rate_limit and not self.controlar_rate_limit():
+                # Lote interrompido durante a espera: a vaga não é usada
+                return None, 0.0
+            
+            inicio = time.time()
+            try:
+                response = self.transporte.obter(url, timeout=30)
+            except requests.exceptions.RequestException:
+                self._registrar_quota(cnpj_limpo, None, (time.time() - inicio) * 1000)
+                raise
+            duracao_ms = round((time.time() - inicio) * 1000, 1)
+            if self.transporte.respeita_rate_limit:
+                self.consultas_realizadas.append(time.time())
+                self._registrar_quota(cnpj_limpo, response.status_code, duracao_ms)
+            
+            if (response.status_code != STATUS_LIMITE or self.quota is None
+                    or tentativa >= TENTATIVAS_LIMITE_EXCEDIDO):
+                return response, duracao_ms
+            self.eventos.aviso('limite_excedido', f"⚠ Limite da API excedido para CNPJ {cnpj_limpo}, tentando novamente",
+                               cnpj=cnpj_limpo, status=STATUS_LIMITE, duracao_ms=duracao_ms, tentativa=tentativa)
+            tentativa += 1
+    
+    def _registrar_quota(self, cnpj_limpo: str, status: Optional[int], duracao_ms: float):
+        """Informa a resposta à quota adaptativa e registra os ajustes de taxa"""
+        if self.quota is None:
+            return
+        motivo = self.quota.registrar(status, duracao_ms)
+        if motivo is not None:
+            self.eventos.info('quota_ajustada', f"Taxa da API ajustada ({motivo}): {self.quota.taxa:.1f} consultas/min",
+                              motivo=motivo, taxa=round(self.quota.taxa, 3), status=status, cnpj=cnpj_limpo)
+    
+    def _registrar_negativo(self, cnpj_limpo: str, motivo: str):
+        """Registra o CNPJ no cache negativo, se houver cache configurado"""
+        if self.cache is not None:
+            self.cache.salvar_negativo(cnpj_limpo, motivo)
     
     def extrair_acronym(self, dados_cnpj: Dict) -> Optional[str]:
         """
@@ -103,129 +355,240 @@ class ConsultorCNPJA:
         except (KeyError, AttributeError, TypeError):
             return None
     
-    def processar_arquivo(self, arquivo: str, coluna_cnpj: str = 'cnpj') -> List[Dict]:
+    def _novo_resultado(self, cnpj_str: str, cnpj_limpo: str, dados: Optional[Dict],
+                        motivo_falha: Optional[str]) -> Dict:
+        """Monta o dicionário de resultado de uma linha"""
+        return {
+            'cnpj_original': cnpj_str,
+            'cnpj_limpo': cnpj_limpo,
+            'consulta_realizada': dados is not None,
+            'acronym': self.extrair_acronym(dados) if dados else None,
+            'dados_completos': dados,
+            'motivo_falha': None if dados else (motivo_falha or self.MOTIVO_ERRO_API)
+        }
+    
+    @staticmethod
+    def resultado_invalido(resultado: Dict) -> bool:
+        """Indica se a linha foi pulada por CNPJ inválido (formato ou dígitos, inclusive do cache)"""
+        return (resultado.get('motivo_falha') or '').startswith('CNPJ inválido')
+    
+    def montar_resultado(self, indice: int, cnpj_str: str, cnpj_limpo: str, valido: bool) -> Dict:
         """
-        Processa um arquivo CSV ou TXT com CNPJs e consulta cada um
-        Retorna uma lista com os resultados
+        Consulta um CNPJ já normalizado e monta o registro de resultado da linha
+        Erros inesperados são registrados no próprio resultado para não perder a linha
+        """
+        try:
+            if not valido:
+                self.eventos.aviso('cnpj_invalido', f"⚠ CNPJ inválido (não possui 14 dígitos), pulando: {cnpj_str} -> {cnpj_limpo}",
+                                   cnpj=cnpj_limpo, motivo=self.MOTIVO_INVALIDO, linha=indice)
+                return self._novo_resultado(cnpj_str, cnpj_limpo, None, self.MOTIVO_INVALIDO)
+            
+            dados, motivo_falha = self.consultar_cnpj_detalhado(cnpj_limpo)
+            return self._novo_resultado(cnpj_str, cnpj_limpo, dados, motivo_falha)
+            
+        except Exception as e:
+            self.eventos.erro('erro_inesperado', f"✗ Erro inesperado ao processar CNPJ {indice} ({cnpj_str}): {str(e)}",
+                              cnpj=cnpj_limpo, linha=indice, erro=str(e))
+            return self._novo_resultado(cnpj_str, cnpj_limpo, None, f'Erro inesperado: {str(e)}')
+    
+    def _preparar_entrada(self, arquivo: str, coluna_cnpj: str) -> Optional[Tuple[int, Iterator[str]]]:
+        """
+        Confere o arquivo de entrada e retorna (total de CNPJs, iterador dos valores)
+        Retorna None se o arquivo não existir ou não puder ser lido
         """
         if not os.path.exists(arquivo):
             print(f"Arquivo não encontrado: {arquivo}")
-            return []
+            return None
         
-        resultados = []
+        try:
+            # Contagem rápida para exibir o progresso (não consulta a API)
+            total_cnpjs = sum(1 for _ in iterar_cnpjs(arquivo, coluna_cnpj))
+            valores = iterar_cnpjs(arquivo, coluna_cnpj)
+        except (OSError, ValueError) as e:
+            print(f"Não foi possível ler o arquivo {arquivo}: {str(e)}")
+            return None
+        return total_cnpjs, valores
+    
+    def _executar_pipeline(self, arquivo: str, coluna_cnpj: str, consumidor,
+                           limite_memoria_mb: Optional[float] = None,
+                           entrada: Optional[Tuple[int, Iterator[str]]] = None) -> Optional[Dict]:
+        """
+        Lê o arquivo em streaming e executa o pipeline de consulta
+        Com limite_memoria_mb, deduplica em memória externa antes de consultar
+        entrada: resultado de _preparar_entrada(), se o arquivo já foi conferido
+        Retorna as estatísticas ou None se o arquivo não puder ser lido
+        """
+        if entrada is None:
+            entrada = self._preparar_entrada(arquivo, coluna_cnpj)
+            if entrada is None:
+                return None
+        total_cnpjs, valores = entrada
+        
+        print(f"Processando {total_cnpjs} CNPJs do arquivo {arquivo}")
+        print("=" * 50)
+        self._avisar_prazo(total_cnpjs)
+        
+        if limite_memoria_mb is not None:
+            try:
+                return self._executar_externo(arquivo, coluna_cnpj, consumidor, limite_memoria_mb)
+            finally:
+                if self.cache is not None:
+                    self.cache.sincronizar()
+                self.encerrar_sessao()
         
+        pipeline = PipelineConsulta(self, self.tamanho_fila)
         try:
-            # Verifica a extensão do arquivo
-            _, extensao = os.path.splitext(arquivo.lower())
-            
-            if extensao == '.csv':
-                # Lê o CSV preservando zeros à esquerda como string
-                df = pd.read_csv(arquivo, dtype={coluna_cnpj: str})
-                
-                if coluna_cnpj not in df.columns:
-                    print(f"Coluna '{coluna_cnpj}' não encontrada no CSV")
-                    print(f"Colunas disponíveis: {list(df.columns)}")
-                    return []
-                
-                cnpjs = df[coluna_cnpj].tolist()
-                
-            elif extensao == '.txt':
-                # Lê o TXT linha por linha
-                with open(arquivo, 'r', encoding='utf-8') as f:
-                    cnpjs = [linha.strip() for linha in f.readlines() if linha.strip()]
-                
-            else:
-                print(f"Formato de arquivo não suportado: {extensao}")
-                print("Formatos suportados: .csv, .txt")
-                return []
-            
-            total_cnpjs = len(cnpjs)
-            
-            print(f"Processando {total_cnpjs} CNPJs do arquivo {arquivo}")
-            print("=" * 50)
+            pipeline.executar(valores, consumidor, total=total_cnpjs)
+        except KeyboardInterrupt:
+            print(f"\n⚠ Processamento interrompido pelo usuário")
+            print(f"Salvando resultados parciais...")
+        except Exception as e:
+            print(f"Erro crítico ao processar arquivo: {str(e)}")
+            # Não descarta o que foi processado até então
+        finally:
+            if self.cache is not None:
+                self.cache.sincronizar()
+            self.encerrar_sessao()
+        
+        return pipeline.estatisticas
+    
+    def _executar_externo(self, arquivo: str, coluna_cnpj: str, consumidor,
+                          limite_memoria_mb: float) -> Dict:
+        """
+        Processamento para entradas maiores que a memória disponível:
+        1. ordena os CNPJs válidos (como inteiros) em disco, dentro do limite de memória
+        2. consulta cada CNPJ único uma vez, com as filiais da mesma empresa juntas
+        3. relê a entrada e entrega os resultados na ordem original das linhas
+        """
+        estatisticas = {'processados': 0, 'validos': 0, 'invalidos': 0, 'duplicados': 0}
+        
+        with OrdenadorExterno(limite_memoria_mb) as ordenador, ResultadosTemporarios(tabelas=self.tabelas) as armazem:
+            for indice, valor in enumerate(iterar_cnpjs(arquivo, coluna_cnpj), 1):
+                cnpj_limpo = self.normalizar_cnpj(valor)
+                if self.validar_cnpj(cnpj_limpo):
+                    ordenador.adicionar(int(cnpj_limpo), indice)
             
-            cnpjs_validos = 0
-            cnpjs_invalidos = 0
+            total_unicos = 0
+            empresas = 0
+            for _, grupo in agrupar_por_raiz(deduplicar(ordenador.ordenados())):
+                empresas += 1
+                total_unicos += len(grupo)
+            estatisticas['duplicados'] = ordenador.total - total_unicos
             
-            for i, cnpj in enumerate(cnpjs, 1):
-                try:
-                    print(f"\nProcessando {i}/{total_cnpjs}")
-                    
-                    # Verifica se CNPJ é válido antes de consultar
-                    # Converte para string e preserva zeros à esquerda
-                    cnpj_str = str(cnpj).strip()
-                    cnpj_limpo = self.limpar_cnpj(cnpj_str)
-                    
-                    # Garante que o CNPJ limpo tenha zeros à esquerda se necessário
-                    if cnpj_limpo.isdigit() and len(cnpj_limpo) < 14:
-                        cnpj_limpo = cnpj_limpo.zfill(14)
-                    
-                    if not self.validar_cnpj(cnpj_limpo):
-                        print(f"⚠ CNPJ inválido (não possui 14 dígitos), pulando: {cnpj_str} -> {cnpj_limpo}")
-                        cnpjs_invalidos += 1
-                        resultado = {
-                            'cnpj_original': cnpj_str,
-                            'cnpj_limpo': cnpj_limpo,
-                            'consulta_realizada': False,
-                            'acronym': None,
-                            'dados_completos': None,
-                            'motivo_falha': 'CNPJ inválido - não possui 14 dígitos'
-                        }
-                    else:
-                        cnpjs_validos += 1
-                        # Consulta o CNPJ
-                        dados = self.consultar_cnpj(cnpj_limpo)
-                        
-                        resultado = {
-                            'cnpj_original': cnpj_str,
-                            'cnpj_limpo': cnpj_limpo,
-                            'consulta_realizada': dados is not None,
-                            'acronym': self.extrair_acronym(dados) if dados else None,
-                            'dados_completos': dados,
-                            'motivo_falha': None if dados else 'Erro na API ou rate limit'
-                        }
-                    
-                    resultados.append(resultado)
-                    
-                except KeyboardInterrupt:
-                    print(f"\n⚠ Processamento interrompido pelo usuário no CNPJ {i}")
-                    print(f"Salvando resultados parciais...")
-                    break
-                except Exception as e:
-                    print(f"✗ Erro inesperado ao processar CNPJ {i} ({cnpj}): {str(e)}")
-                    # Adiciona um resultado de erro para não perder o registro
-                    cnpj_str = str(cnpj).strip() if 'cnpj' in locals() else 'N/A'
-                    resultado = {
-                        'cnpj_original': cnpj_str,
-                        'cnpj_limpo': self.limpar_cnpj(cnpj_str).zfill(14) if cnpj_str != 'N/A' else '',
-                        'consulta_realizada': False,
-                        'acronym': None,
-                        'dados_completos': None,
-                        'motivo_falha': f'Erro inesperado: {str(e)}'
-                    }
-                    resultados.append(resultado)
-                    # Continua o processamento mesmo com erro
+            print(f"Deduplicação em disco: {ordenador.total} CNPJs válidos, {total_unicos} únicos "
+                  f"de {empresas} empresas ({ordenador.runs_em_disco} blocos ordenados em disco)")
             
-            print(f"\n" + "=" * 50)
-            print(f"Processamento concluído: {len(resultados)} CNPJs processados")
-            print(f"CNPJs válidos: {cnpjs_validos}")
-            print(f"CNPJs inválidos (pulados): {cnpjs_invalidos}")
+            def cnpjs_unicos():
+                for _, grupo in agrupar_por_raiz(deduplicar(ordenador.ordenados())):
+                    for cnpj, _, _ in grupo:
+                        yield f"{cnpj:014d}"
             
-            # Verifica se processou todos os CNPJs
-            if len(resultados) < total_cnpjs:
-                cnpjs_nao_processados = total_cnpjs - len(resultados)
-                print(f"⚠ Aviso: {cnpjs_nao_processados} CNPJs não foram processados devido a erros")
+            pipeline = PipelineConsulta(self, self.tamanho_fila)
+            try:
+                pipeline.executar(cnpjs_unicos(), armazem.gravar, total=total_unicos)
+            except KeyboardInterrupt:
+                print(f"\n⚠ Processamento interrompido pelo usuário")
+                print(f"Salvando resultados parciais...")
+            except Exception as e:
+                print(f"Erro crítico ao processar arquivo: {str(e)}")
             
-        except KeyboardInterrupt:
-            print(f"\n⚠ Processamento interrompido pelo usuário")
-            print(f"CNPJs processados até o momento: {len(resultados)}")
-        except Exception as e:
-            print(f"Erro crítico ao processar CSV: {str(e)}")
-            print(f"CNPJs processados antes do erro: {len(resultados)}")
-            # Não retorna vazio mesmo com erro - retorna o que foi processado até então
+            # Remonta a saída na ordem original do arquivo
+            for indice, valor in enumerate(iterar_cnpjs(arquivo, coluna_cnpj), 1):
+                cnpj_str = str(valor).strip()
+                cnpj_limpo = self.normalizar_cnpj(cnpj_str)
+                
+                if not self.validar_cnpj(cnpj_limpo):
+                    # Sem eventos por linha: o pipeline já terminou e o console foi restaurado
+                    resultado = self._novo_resultado(cnpj_str, cnpj_limpo, None, self.MOTIVO_INVALIDO)
+                else:
+                    dados, motivo_falha = armazem.obter(int(cnpj_limpo)) or (None, self.MOTIVO_NAO_CONSULTADO)
+                    resultado = self._novo_resultado(cnpj_str, cnpj_limpo, dados, motivo_falha)
+                
+                # Mesma classificação do pipeline: dígitos verificadores incorretos contam como inválidos
+                if self.resultado_invalido(resultado):
+                    estatisticas['invalidos'] += 1
+                else:
+                    estatisticas['validos'] += 1
+                estatisticas['processados'] += 1
+                consumidor(resultado)
+        
+        return estatisticas
+    
+    def processar_arquivo(self, arquivo: str, coluna_cnpj: str = 'cnpj',
+                          limite_memoria_mb: Optional[float] = None) -> List[Dict]:
+        """
+        Processa um arquivo com CNPJs (CSV, TXT, XLSX, .gz ou ZIP; veja leitores.py) e consulta cada um
+        Retorna uma lista com os resultados, na ordem do arquivo
+        Com limite_memoria_mb, CNPJs repetidos são deduplicados em disco e consultados uma vez
+        """
+        resultados = []
+        estatisticas = self._executar_pipeline(arquivo, coluna_cnpj, resultados.append,
+                                               limite_memoria_mb)
+        
+        if estatisticas is not None:
+            self._exibir_resumo_processamento(len(resultados), estatisticas)
         
         return resultados
     
+    def processar_e_salvar(self, arquivo: str, arquivo_saida: Optional[str] = None,
+                           coluna_cnpj: str = 'cnpj',
+                           limite_memoria_mb: Optional[float] = None) -> Optional[Dict]:
+        """
+        Processa o arquivo gravando cada resultado no CSV de saída assim que fica pronto
+        A memória usada não cresce com o tamanho do lote; retorna as estatísticas
+        """
+        # Confere a entrada antes de criar a saída: um arquivo ausente não deixa um CSV vazio
+        entrada = self._preparar_entrada(arquivo, coluna_cnpj)
+        if entrada is None:
+            return None
+        
+        if arquivo_saida is None:
+            arquivo_saida = self._nome_arquivo_saida()
+        
+        with open(arquivo_saida, 'w', encoding='utf-8-sig', newline='') as f:
+            # Mesmo formato de salvar_resultados (pandas): quebras de linha '\n'
+            escritor = csv.DictWriter(f, fieldnames=COLUNAS_RESULTADO, extrasaction='ignore',
+                                      lineterminator='\n')
+            escritor.writeheader()
+            estatisticas = self._executar_pipeline(
+                arquivo, coluna_cnpj,
+                lambda resultado: escritor.writerow(self._montar_linha_csv(resultado)),
+                limite_memoria_mb, entrada
+            )
+        
+        if estatisticas is not None:
+            self._exibir_resumo_processamento(estatisticas['processados'], estatisticas)
+            print(f"\nResultados salvos em: {arquivo_saida}")
+        
+        return estatisticas
+    
+    def _exibir_resumo_processamento(self, processados: int, estatisticas: Dict):
+        """Exibe o resumo ao final de um processamento em lote"""
+        print(f"\n" + "=" * 50)
+        print(f"Processamento concluído: {processados} CNPJs processados")
+        print(f"CNPJs válidos: {estatisticas['validos']}")
+        print(f"CNPJs inválidos (pulados): {estatisticas['invalidos']}")
+        if estatisticas.get('duplicados'):
+            print(f"CNPJs repetidos (consultados uma única vez): {estatisticas['duplicados']}")
+    
+    def planejar_arquivo(self, arquivo: str, coluna_cnpj: str = 'cnpj') -> Optional[Dict]:
+        """
+        Estima o lote (consultas reais à API e tempo total) sem consultar a API
+        Veja planejador.planejar_arquivo()
+        """
+        return planejar_arquivo(self, arquivo, coluna_cnpj)
+    
+    def enriquecer_arquivo(self, arquivo_original: str, arquivo_saida: str,
+                           coluna_cnpj: str = 'cnpj', campos: Optional[List[str]] = None,
+                           arquivo_resultados: Optional[str] = None,
+                           resultados: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """
+        Copia o CSV original acrescentando campos dos resultados, juntando por cnpj_limpo
+        Veja enriquecimento.enriquecer_arquivo()
+        """
+        return enriquecer_arquivo(self, arquivo_original, arquivo_saida, coluna_cnpj, campos,
+                                  arquivo_resultados, resultados)
+    
     def processar_csv(self, arquivo_csv: str, coluna_cnpj: str = 'cnpj') -> List[Dict]:
         """
         Método de compatibilidade para processar CSV
@@ -240,64 +603,110 @@ class ConsultorCNPJA:
         """
         return self.processar_arquivo(arquivo_txt)
     
-    def salvar_resultados(self, resultados: List[Dict], arquivo_saida: Optional[str] = None):
+    def _nome_arquivo_saida(self) -> str:
+        """Nome padrão do arquivo de resultados, com timestamp"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"resultados_cnpj_{timestamp}.csv"
+    
+    def _montar_linha_csv(self, resultado: Dict, codificar_referencias: bool = False) -> Dict:
+        """
+        Converte um resultado em uma linha do CSV de saída
+        Com codificar_referencias, as colunas de COLUNAS_REFERENCIA recebem os códigos
+        das tabelas de referência em vez das descrições
+        """
+        linha = {
+            'cnpj_original': resultado['cnpj_original'],
+            'cnpj_limpo': resultado['cnpj_limpo'],
+            'consulta_realizada': resultado['consulta_realizada'],
+            'acronym': resultado['acronym'] or '',
+            'motivo_falha': resultado.get('motivo_falha', '') or ''
+        }
+        
+        # Adiciona alguns campos principais dos dados completos se disponíveis
+        if resultado['dados_completos']:
+            dados = resultado['dados_completos']
+            
+            linha.update({
+                'razao_social': dados.get('razao_social', ''),
+                'nome_fantasia': dados.get('nome_fantasia', ''),
+                'situacao': dados.get('descricao_situacao_cadastral', ''),
+                'porte': dados.get('porte', ''),  # DEMAIS, ME, EPP, etc.
+                'codigo_porte': dados.get('codigo_porte', ''),
+                'natureza_juridica': dados.get('natureza_juridica', ''),
+                'cnae_fiscal': dados.get('cnae_fiscal', ''),
+                'cnae_fiscal_descricao': dados.get('cnae_fiscal_descricao', ''),
+                'telefone': dados.get('ddd_telefone_1', ''),
+                'telefone_2': dados.get('ddd_telefone_2', ''),
+                'email': dados.get('email', ''),
+                'cep': dados.get('cep', ''),
+                'municipio': dados.get('municipio', ''),
+                'uf': dados.get('uf', ''),
+                'logradouro': dados.get('logradouro', ''),
+                'numero': dados.get('numero', ''),
+                'bairro': dados.get('bairro', ''),
+                'complemento': dados.get('complemento', ''),
+                'capital_social': dados.get('capital_social', ''),
+                'data_inicio_atividade': dados.get('data_inicio_atividade', ''),
+                'data_situacao_cadastral': dados.get('data_situacao_cadastral', ''),
+            })
+            
+            if codificar_referencias:
+                for coluna, campo in COLUNAS_REFERENCIA.items():
+                    linha[coluna] = self._codigo_referencia(dados, campo)
+        
+        return linha
+    
+    def _codigo_referencia(self, dados, campo: str) -> int:
+        """Código do campo de referência nas tabelas deste consultor (-1 = ausente)"""
+        if isinstance(dados, DadosCompactos) and dados.tabelas is self.tabelas:
+            codigo = dados.codigo(campo)
+        else:
+            valor = dados.get(campo)
+            codigo = self.tabelas.codificar(campo, str(valor)) if valor is not None else None
+        return -1 if codigo is None else codigo
+    
+    def salvar_resultados(self, resultados: List[Dict], arquivo_saida: Optional[str] = None,
+                          particionar_por: Optional[str] = None,
+                          linhas_por_particao: int = LINHAS_POR_PARTICAO):
         """
         Salva os resultados em um arquivo CSV
+        Com particionar_por ('uf', 'porte' ou 'linhas'), arquivo_saida é um diretório
+        com um CSV por partição, gravados em paralelo, e o manifesto.json
         """
         if not resultados:
             print("Nenhum resultado para salvar")
             return
         
         if arquivo_saida is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            arquivo_saida = f"resultados_cnpj_{timestamp}.csv"
+            arquivo_saida = self._nome_arquivo_saida()
+            if particionar_por is not None:
+                arquivo_saida = os.path.splitext(arquivo_saida)[0]
         
-        # Prepara os dados para o CSV
-        dados_csv = []
-        for resultado in resultados:
-            linha = {
-                'cnpj_original': resultado['cnpj_original'],
-                'cnpj_limpo': resultado['cnpj_limpo'],
-                'consulta_realizada': resultado['consulta_realizada'],
-                'acronym': resultado['acronym'] or '',
-                'motivo_falha': resultado.get('motivo_falha', '') or ''
-            }
-            
-            # Adiciona alguns campos principais dos dados completos se disponíveis
-            if resultado['dados_completos']:
-                dados = resultado['dados_completos']
-                
-                linha.update({
-                    'razao_social': dados.get('razao_social', ''),
-                    'nome_fantasia': dados.get('nome_fantasia', ''),
-                    'situacao': dados.get('descricao_situacao_cadastral', ''),
-                    'porte': dados.get('porte', ''),  # DEMAIS, ME, EPP, etc.
-                    'codigo_porte': dados.get('codigo_porte', ''),
-                    'natureza_juridica': dados.get('natureza_juridica', ''),
-                    'cnae_fiscal': dados.get('cnae_fiscal', ''),
-                    'cnae_fiscal_descricao': dados.get('cnae_fiscal_descricao', ''),
-                    'telefone': dados.get('ddd_telefone_1', ''),
-                    'telefone_2': dados.get('ddd_telefone_2', ''),
-                    'email': dados.get('email', ''),
-                    'cep': dados.get('cep', ''),
-                    'municipio': dados.get('municipio', ''),
-                    'uf': dados.get('uf', ''),
-                    'logradouro': dados.get('logradouro', ''),
-                    'numero': dados.get('numero', ''),
-                    'bairro': dados.get('bairro', ''),
-                    'complemento': dados.get('complemento', ''),
-                    'capital_social': dados.get('capital_social', ''),
-                    'data_inicio_atividade': dados.get('data_inicio_atividade', ''),
-                    'data_situacao_cadastral': dados.get('data_situacao_cadastral', ''),
-                })
-            
-            dados_csv.append(linha)
+        # Prepara os dados para o CSV (descrições repetidas como códigos)
+        dados_csv = [self._montar_linha_csv(resultado, codificar_referencias=True)
+                     for resultado in resultados]
         
         # Salva no CSV
         try:
-            df_resultado = pd.DataFrame(dados_csv)
-            df_resultado.to_csv(arquivo_saida, index=False, encoding='utf-8-sig')
-            print(f"\nResultados salvos em: {arquivo_saida}")
+            # dtype=object e '' nas ausências, como no csv.DictWriter de processar_e_salvar:
+            # sem isso, colunas numéricas com lacunas viram float (6201501 -> 6201501.0)
+            df_resultado = pd.DataFrame(dados_csv, columns=COLUNAS_RESULTADO, dtype=object)
+            colunas_texto = [coluna for coluna in COLUNAS_RESULTADO if coluna not in COLUNAS_REFERENCIA]
+            df_resultado[colunas_texto] = df_resultado[colunas_texto].fillna('')
+            # Colunas categóricas: cada descrição fica uma vez na memória e só é escrita na saída
+            for coluna, campo in COLUNAS_REFERENCIA.items():
+                if coluna in df_resultado:
+                    codigos = df_resultado[coluna].fillna(-1).astype(int)
+                    categorias = self.tabelas.valores(campo, int(codigos.max()))
+                    df_resultado[coluna] = pd.Categorical.from_codes(codigos, categorias)
+            if particionar_por is not None:
+                manifesto = salvar_particionado(df_resultado, arquivo_saida, particionar_por,
+                                                linhas_por_particao)
+                print(f"\nResultados salvos em: {arquivo_saida}/ "
+                      f"({len(manifesto['particoes'])} partições por {particionar_por})")
+            else:
+                df_resultado.to_csv(arquivo_saida, index=False, encoding='utf-8-sig')
+                print(f"\nResultados salvos em: {arquivo_saida}")
             print(f"Total de registros: {len(dados_csv)}")
             
             # Estatísticas
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Enriquecimento do arquivo original do cliente com os resultados das consultas
+O arquivo original é lido em streaming e cada linha recebe os campos escolhidos,
+obtidos de um índice hash (cnpj_limpo -> campos) montado a partir dos resultados.
+Apenas os campos selecionados ficam em memória; o arquivo original nunca é
+carregado inteiro.
+"""
+
+import csv
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from leitores import detectar_formato, ler_cabecalho_csv
+
+# Campos adicionados por padrão ao arquivo original
+CAMPOS_PADRAO = ['razao_social', 'porte', 'situacao', 'cnae_fiscal', 'municipio', 'uf']
+
+
+def _consulta_realizada(linha: Dict) -> bool:
+    """
+    Só as linhas consultadas com sucesso entram no índice: as falhas (CNPJ inválido,
+    não encontrado, erro da API, cache negativo) têm os campos vazios e contam como sem resultado
+    """
+    # No CSV o valor vem como texto ('True'/'False')
+    return str(linha.get('consulta_realizada')) == 'True'
+
+
+def indexar_resultados_csv(arquivo_resultados: str, campos: List[str]) -> Dict[str, Tuple]:
+    """Monta o índice cnpj_limpo -> valores dos campos a partir de um CSV de resultados"""
+    indice = {}
+    with open(arquivo_resultados, 'r', encoding='utf-8-sig', newline='') as f:
+        leitor = csv.DictReader(f)
+        obrigatorios = ['cnpj_limpo', 'consulta_realizada', *campos]
+        ausentes = [campo for campo in obrigatorios if campo not in (leitor.fieldnames or [])]
+        if ausentes:
+            raise ValueError(f"Campos ausentes no arquivo de resultados: {ausentes}")
+        for linha in leitor:
+            if not _consulta_realizada(linha):
+                continue
+            # Valores repetidos (UF, porte, situação...) passam a compartilhar a mesma string
+            indice[linha['cnpj_limpo']] = tuple(sys.intern(linha[campo]) for campo in campos)
+    return indice
+
+
+def indexar_resultados(linhas: Iterable[Dict], campos: List[str]) -> Dict[str, Tuple]:
+    """Monta o índice a partir de linhas já convertidas (ex: _montar_linha_csv)"""
+    return {
+        linha['cnpj_limpo']: tuple(sys.intern(str(linha.get(campo, '') or '')) for campo in campos)
+        for linha in linhas
+        if _consulta_realizada(linha)
+    }
+
+
+def enriquecer_arquivo(consultor, arquivo_original: str, arquivo_saida: str,
+                       coluna_cnpj: str = 'cnpj', campos: Optional[List[str]] = None,
+                       arquivo_resultados: Optional[str] = None,
+                       resultados: Optional[List[Dict]] = None) -> Optional[Dict]:
+    """
+    Grava arquivo_saida com as colunas originais, na ordem original, seguidas dos campos enriquecidos
+    Os resultados vêm de um CSV (arquivo_resultados) ou da lista retornada por processar_arquivo
+    Retorna estatísticas do enriquecimento ou None em caso de erro
+    """
+    campos = list(campos or CAMPOS_PADRAO)
+
+    if detectar_formato(arquivo_original) != '.csv':
+        print(f"✗ O enriquecimento requer um arquivo original CSV: {arquivo_original}")
+        return None
+
+    try:
+        colunas = ler_cabecalho_csv(arquivo_original)
+        if coluna_cnpj not in colunas:
+            print(f"✗ Coluna '{coluna_cnpj}' não encontrada no CSV. Colunas disponíveis: {colunas}")
+            return None
+
+        if arquivo_resultados is not None:
+            indice = indexar_resultados_csv(arquivo_resultados, campos)
+        elif resultados is not None:
+            indice = indexar_resultados(
+                (consultor._montar_linha_csv(resultado) for resultado in resultados), campos
+            )
+        else:
+            print("✗ Informe o arquivo de resultados ou a lista de resultados")
+            return None
+    except (OSError, ValueError) as e:
+        print(f"✗ Erro ao preparar o enriquecimento: {str(e)}")
+        return None
+
+    # Evita sobrescrever colunas que já existem no arquivo original
+    nomes_novos = [campo if campo not in colunas else f"{campo}_enriquecido" for campo in campos]
+    posicao_cnpj = colunas.index(coluna_cnpj)
+    vazio = ('',) * len(campos)
+    estatisticas = {'linhas': 0, 'enriquecidas': 0, 'sem_resultado': 0}
+
+    with open(arquivo_original, 'r', encoding='utf-8-sig', newline='') as entrada, \
+            open(arquivo_saida, 'w', encoding='utf-8-sig', newline='') as saida:
+        leitor = csv.reader(entrada)
+        escritor = csv.writer(saida)
+        # As colunas são comparadas sem espaços nas pontas, mas o cabeçalho sai como no original
+        escritor.writerow(next(leitor, []) + nomes_novos)
+
+        for linha in leitor:
+            if not linha:
+                continue
+            estatisticas['linhas'] += 1
+            valor = linha[posicao_cnpj] if posicao_cnpj < len(linha) else ''
+            valores = indice.get(consultor.normalizar_cnpj(valor))
+
+            if valores is None:
+                estatisticas['sem_resultado'] += 1
+                valores = vazio
+            else:
+                estatisticas['enriquecidas'] += 1
+
+            # Completa linhas curtas para manter o alinhamento das colunas
+            if len(linha) < len(colunas):
+                linha = linha + [''] * (len(colunas) - len(linha))
+            escritor.writerow(linha + list(valores))
+
+    print(f"\n✓ Arquivo enriquecido salvo em: {arquivo_saida}")
+    print(f"Linhas: {estatisticas['linhas']}")
+    print(f"Linhas enriquecidas: {estatisticas['enriquecidas']}")
+    print(f"Linhas sem resultado: {estatisticas['sem_resultado']}")
+    return estatisticas
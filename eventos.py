@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro estruturado de eventos e progresso ao vivo
+- RegistroEventos: cada evento (consulta, acerto de cache, erro...) vira uma
+  linha JSON com nível, nome e campos; a mensagem legível só é exibida no
+  console quando o console está ativo (consultas individuais ou modo verboso)
+- ProgressoAoVivo: uma linha de status atualizada em intervalo fixo com
+  linhas/s, tempo restante, taxa de acerto do cache e erros, no lugar das
+  mensagens por linha
+"""
+
+import json
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from planejador import formatar_duracao
+
+# Níveis dos eventos (o arquivo de eventos registra a partir do nível mínimo)
+NIVEIS = {'debug': 10, 'info': 20, 'aviso': 30, 'erro': 40}
+
+# O arquivo de eventos é descarregado no disco a cada N eventos (e sempre ao fechar)
+DESCARGA_A_CADA = 200
+
+
+class RegistroEventos:
+    """
+    Emite eventos estruturados para um arquivo JSON Lines e, opcionalmente, para o console
+    Observadores (ex: ProgressoAoVivo) recebem todos os eventos, de qualquer nível
+    """
+
+    def __init__(self, arquivo: Optional[str] = None, nivel_minimo: str = 'info',
+                 console: bool = True):
+        if nivel_minimo not in NIVEIS:
+            raise ValueError(f"Nível desconhecido: {nivel_minimo}. Níveis: {', '.join(NIVEIS)}")
+        self.arquivo = arquivo
+        self.nivel_minimo = NIVEIS[nivel_minimo]
+        self.console = console
+        self._lock = threading.Lock()
+        self._observadores: List[Callable[[str, str, Dict], None]] = []
+        self._pendentes = 0
+        self._saida = open(arquivo, 'a', encoding='utf-8') if arquivo else None
+
+    def observar(self, observador: Callable[[str, str, Dict], None]):
+        """Registra uma função chamada como observador(nivel, evento, campos)"""
+        # Substitui a lista em vez de alterá-la: emitir() pode estar percorrendo a anterior
+        self._observadores = [*self._observadores, observador]
+
+    def remover_observador(self, observador: Callable[[str, str, Dict], None]):
+        self._observadores = [atual for atual in self._observadores if atual is not observador]
+
+    def emitir(self, nivel: str, evento: str, mensagem: Optional[str] = None, **campos):
+        """Registra um evento; a mensagem é a forma legível exibida no console"""
+        for observador in self._observadores:
+            observador(nivel, evento, campos)
+
+        if self.console and mensagem is not None:
+            print(mensagem)
+
+        if self._saida is not None and NIVEIS[nivel] >= self.nivel_minimo:
+            registro = {'ts': round(time.time(), 3), 'nivel': nivel, 'evento': evento, **campos}
+            if mensagem is not None:
+                registro['mensagem'] = mensagem.strip()
+            linha = json.dumps(registro, ensure_ascii=False, default=str)
+            with self._lock:
+                self._saida.write(linha + '\n')
+                self._pendentes += 1
+                if self._pendentes >= DESCARGA_A_CADA:
+                    self._saida.flush()
+                    self._pendentes = 0
+
+    def debug(self, evento: str, mensagem: Optional[str] = None, **campos):
+        self.emitir('debug', evento, mensagem, **campos)
+
+    def info(self, evento: str, mensagem: Optional[str] = None, **campos):
+        self.emitir('info', evento, mensagem, **campos)
+
+    def aviso(self, evento: str, mensagem: Optional[str] = None, **campos):
+        self.emitir('aviso', evento, mensagem, **campos)
+
+    def erro(self, evento: str, mensagem: Optional[str] = None, **campos):
+        self.emitir('erro', evento, mensagem, **campos)
+
+    def fechar(self):
+        """Grava os eventos pendentes e fecha o arquivo"""
+        with self._lock:
+            if self._saida is not None:
+                self._saida.close()
+                self._saida = None
+
+
+class ProgressoAoVivo:
+    """
+    Linha de progresso atualizada por uma thread em intervalo fixo
+    Os contadores vêm dos eventos do RegistroEventos (linha_concluida, cache_acerto...)
+    """
+
+    # Eventos que indicam resposta do cache local ou uma ida à API
+    EVENTOS_CACHE = ('cache_acerto', 'cache_negativo')
+    EVENTOS_API = ('consulta_api', 'nao_encontrado', 'erro_api')
+
+    def __init__(self, eventos: RegistroEventos, total: Optional[int] = None,
+                 intervalo: float = 0.5, saida=None):
+        self.eventos = eventos
+        self.total = total
+        self.saida = saida if saida is not None else sys.stdout
+        # Fora de um terminal, uma linha nova a cada 10s em vez de reescrever a mesma
+        self.interativo = hasattr(self.saida, 'isatty') and self.saida.isatty()
+        self.intervalo = intervalo if self.interativo else max(intervalo, 10.0)
+        self.contadores = {'processados': 0, 'cache': 0, 'api': 0, 'erros': 0}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._inicio = None
+        self._largura = 0
+
+    def _observar(self, nivel: str, evento: str, campos: Dict):
+        if evento == 'linha_concluida':
+            chave = 'processados'
+        elif evento in self.EVENTOS_CACHE:
+            chave = 'cache'
+        elif evento in self.EVENTOS_API:
+            chave = 'api'
+        else:
+            chave = None
+        with self._lock:
+            if chave is not None:
+                self.contadores[chave] += 1
+            if nivel == 'erro':
+                self.contadores['erros'] += 1
+
+    def linha_status(self) -> str:
+        """Texto da linha de progresso com os contadores atuais"""
+        with self._lock:
+            processados = self.contadores['processados']
+            cache = self.contadores['cache']
+            api = self.contadores['api']
+            erros = self.contadores['erros']
+        decorrido = max(time.time() - self._inicio, 1e-6)
+        taxa = processados / decorrido
+
+        partes = [f"{processados}/{self.total}" if self.total else str(processados)]
+        if self.total:
+            partes[0] += f" ({processados / self.total:.1%})"
+        partes.append(f"{taxa:.1f} linhas/s")
+        if self.total and taxa > 0:
+            partes.append(f"restante {formatar_duracao((self.total - processados) / taxa)}")
+        if cache + api:
+            partes.append(f"cache {cache / (cache + api):.0%}")
+        partes.append(f"erros {erros}")
+        return " | ".join(partes)
+
+    def _exibir(self):
+        linha = self.linha_status()
+        if self.interativo:
+            # Completa com espaços para apagar restos de uma linha anterior mais longa
+            self.saida.write("\r" + linha.ljust(self._largura))
+            self._largura = len(linha)
+        else:
+            self.saida.write(linha + "\n")
+        self.saida.flush()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self._exibir()
+
+    def iniciar(self):
+        """Começa a observar os eventos e a atualizar a linha de progresso"""
+        self._inicio = time.time()
+        self.eventos.observar(self._observar)
+        self._thread = threading.Thread(target=self._executar, name='progresso', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        """Para a atualização e exibe a linha final"""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.eventos.remover_observador(self._observar)
+        self._exibir()
+        if self.interativo:
+            self.saida.write("\n")
+            self.saida.flush()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índices secundários sobre os dados das empresas já consultadas
+Permite responder filtros como "CNPJs em SP, porte ME, CNAE 6201-5" sem reler
+os CSVs de resultado. O índice é atualizado a cada consulta bem-sucedida e pode
+ser reconstruído a partir do cache local.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Apelidos aceitos nas consultas para o campo 'porte' da Brasil API
+APELIDOS_PORTE = {
+    'ME': 'MICRO EMPRESA',
+    'MICRO': 'MICRO EMPRESA',
+    'EPP': 'EMPRESA DE PEQUENO PORTE',
+}
+
+# Colunas indexadas individualmente
+COLUNAS_INDEXADAS = ('uf', 'municipio', 'porte', 'cnae_fiscal', 'situacao', 'raiz')
+
+
+def _texto(valor) -> Optional[str]:
+    """Normaliza um valor textual para comparação (maiúsculas, sem espaços extras)"""
+    if valor is None:
+        return None
+    texto = str(valor).strip().upper()
+    return texto or None
+
+
+def _digitos(valor) -> Optional[str]:
+    """Mantém apenas os dígitos de um código (ex: '6201-5/01' -> '6201501')"""
+    if valor is None:
+        return None
+    digitos = re.sub(r'[^0-9]', '', str(valor))
+    return digitos or None
+
+
+def _fim_prefixo(prefixo: str) -> Optional[str]:
+    """
+    Menor texto maior que todos os que começam com o prefixo (ex: '62' -> '63',
+    '0199' -> '02'); None quando o prefixo só tem '9' e não há limite superior
+    """
+    sem_noves = prefixo.rstrip('9')
+    if not sem_noves:
+        return None
+    return sem_noves[:-1] + chr(ord(sem_noves[-1]) + 1)
+
+
+def extrair_atributos(cnpj: str, dados: Dict) -> Tuple:
+    """Extrai da resposta da API os atributos indexados, na ordem da tabela"""
+    cnae = _digitos(dados.get('cnae_fiscal'))
+    return (
+        cnpj,
+        cnpj[:8],
+        _texto(dados.get('uf')),
+        _texto(dados.get('municipio')),
+        _texto(dados.get('porte')),
+        cnae.zfill(7) if cnae else None,
+        _texto(dados.get('descricao_situacao_cadastral')),
+        time.time(),
+    )
+
+
+class IndiceEmpresas:
+    """
+    Índice SQLite com um índice B-tree por atributo consultável
+    """
+
+    def __init__(self, arquivo: str = 'indice_cnpj.db'):
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(arquivo, check_same_thread=False)
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS empresas ("
+            " cnpj TEXT PRIMARY KEY,"
+            " raiz TEXT NOT NULL,"
+            " uf TEXT,"
+            " municipio TEXT,"
+            " porte TEXT,"
+            " cnae_fiscal TEXT,"
+            " situacao TEXT,"
+            " atualizado_em REAL NOT NULL)"
+        )
+        for coluna in COLUNAS_INDEXADAS:
+            self._conexao.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_empresas_{coluna} ON empresas ({coluna})"
+            )
+        # Combinação mais comum nas solicitações: estado + porte + atividade
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_empresas_uf_porte_cnae"
+            " ON empresas (uf, porte, cnae_fiscal)"
+        )
+        self._conexao.commit()
+
+    def registrar(self, cnpj: str, dados: Dict):
+        """Indexa (ou atualiza) os atributos de um CNPJ"""
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO empresas"
+                " (cnpj, raiz, uf, municipio, porte, cnae_fiscal, situacao, atualizado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                extrair_atributos(cnpj, dados)
+            )
+            self._conexao.commit()
+
+    def registrar_varios(self, registros: Iterable[Tuple[str, Dict]]) -> int:
+        """Indexa vários CNPJs em uma única transação; retorna a quantidade indexada"""
+        total = 0
+
+        def linhas():
+            nonlocal total
+            for cnpj, dados in registros:
+                total += 1
+                yield extrair_atributos(cnpj, dados)
+
+        with self._lock:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO empresas"
+                " (cnpj, raiz, uf, municipio, porte, cnae_fiscal, situacao, atualizado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                linhas()
+            )
+            self._conexao.commit()
+        return total
+
+    def _filtros(self, uf=None, municipio=None, porte=None, cnae=None,
+                 situacao=None, raiz=None) -> Tuple[str, list]:
+        """Monta a cláusula WHERE a partir dos filtros informados"""
+        condicoes = []
+        parametros = []
+
+        for coluna, valor in (('uf', _texto(uf)), ('municipio', _texto(municipio)),
+                              ('situacao', _texto(situacao))):
+            if valor is not None:
+                condicoes.append(f"{coluna} = ?")
+                parametros.append(valor)
+
+        porte = _texto(porte)
+        if porte is not None:
+            condicoes.append("porte = ?")
+            parametros.append(APELIDOS_PORTE.get(porte, porte))
+
+        cnae = _digitos(cnae)
+        if cnae is not None:
+            if len(cnae) >= 7:
+                condicoes.append("cnae_fiscal = ?")
+                parametros.append(cnae[:7])
+            else:
+                # Prefixo (divisão, grupo, classe...) como intervalo para usar o índice
+                fim = _fim_prefixo(cnae)
+                condicoes.append("cnae_fiscal >= ?")
+                parametros.append(cnae)
+                if fim is not None:
+                    condicoes.append("cnae_fiscal < ?")
+                    parametros.append(fim)
+
+        raiz = _digitos(raiz)
+        if raiz is not None:
+            condicoes.append("raiz = ?")
+            parametros.append(raiz.zfill(8)[:8])
+
+        clausula = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+        return clausula, parametros
+
+    def consultar(self, limite: Optional[int] = None, **filtros) -> List[str]:
+        """
+        Retorna os CNPJs que atendem a todos os filtros
+        Filtros: uf, municipio, porte (aceita ME/EPP), cnae (código ou prefixo), situacao, raiz
+        """
+        clausula, parametros = self._filtros(**filtros)
+        sql = f"SELECT cnpj FROM empresas{clausula} ORDER BY cnpj"
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(int(limite))
+        with self._lock:
+            return [linha[0] for linha in self._conexao.execute(sql, parametros)]
+
+    def contar(self, **filtros) -> int:
+        """Conta os CNPJs que atendem aos filtros"""
+        clausula, parametros = self._filtros(**filtros)
+        with self._lock:
+            return self._conexao.execute(
+                f"SELECT COUNT(*) FROM empresas{clausula}", parametros
+            ).fetchone()[0]
+
+    def fechar(self):
+        """Fecha a conexão com o banco do índice"""
+        with self._lock:
+            self._conexao.close()
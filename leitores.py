@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leitura em streaming dos arquivos de entrada com CNPJs
+Os valores são entregues um a um, sem carregar o arquivo inteiro em memória
+e sem descompactar para arquivos temporários:
+- CSV e TXT, também compactados com gzip (.csv.gz, .txt.gz)
+- XLSX, lido linha a linha em modo somente leitura (requer openpyxl)
+- ZIP com um ou mais arquivos nos formatos acima, lidos em sequência
+Arquivos TXT descompactados são percorridos via mmap.
+"""
+
+import csv
+import gzip
+import io
+import mmap
+import os
+import zipfile
+from typing import Callable, Iterator, List
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+FORMATOS_SUPORTADOS = ('.csv', '.txt', '.csv.gz', '.txt.gz', '.xlsx', '.zip')
+
+# Formatos aceitos dentro de um ZIP
+FORMATOS_ZIP = ('.csv', '.txt', '.csv.gz', '.txt.gz', '.xlsx')
+
+# Bytes do TXT mapeado processados por vez
+TAMANHO_BLOCO_TXT = 1 << 20
+
+
+def detectar_formato(arquivo: str) -> str:
+    """Retorna a extensão do arquivo em minúsculas (ex: '.csv', '.csv.gz')"""
+    raiz, extensao = os.path.splitext(arquivo.lower())
+    if extensao == '.gz':
+        extensao = os.path.splitext(raiz)[1] + extensao
+    return extensao
+
+
+def iterar_cnpjs(arquivo: str, coluna_cnpj: str = 'cnpj') -> Iterator[str]:
+    """
+    Itera sobre os valores de CNPJ de um arquivo em qualquer formato suportado
+    Levanta ValueError se o formato não for suportado ou a coluna não existir
+    """
+    extensao = detectar_formato(arquivo)
+
+    if extensao == '.csv':
+        return _iterar_csv(lambda: open(arquivo, 'rb'), coluna_cnpj, arquivo)
+    elif extensao == '.csv.gz':
+        return _iterar_csv(lambda: gzip.open(arquivo, 'rb'), coluna_cnpj, arquivo)
+    elif extensao == '.txt':
+        return _iterar_txt_mmap(arquivo)
+    elif extensao == '.txt.gz':
+        return _iterar_txt(lambda: gzip.open(arquivo, 'rb'))
+    elif extensao == '.xlsx':
+        return _iterar_xlsx(lambda: arquivo, coluna_cnpj, arquivo)
+    elif extensao == '.zip':
+        return _iterar_zip(arquivo, coluna_cnpj)
+
+    raise ValueError(
+        f"Formato de arquivo não suportado: {extensao}. "
+        f"Formatos suportados: {', '.join(FORMATOS_SUPORTADOS)}"
+    )
+
+
+def _normalizar_colunas(valores) -> List[str]:
+    """Nomes de colunas de um cabeçalho, sem espaços nas pontas (igual em CSV e XLSX)"""
+    return [str(valor).strip() for valor in valores]
+
+
+def ler_cabecalho_csv(arquivo: str) -> list:
+    """Retorna a lista de colunas do cabeçalho de um CSV"""
+    with open(arquivo, 'r', encoding='utf-8-sig', newline='') as f:
+        return _normalizar_colunas(next(csv.reader(f), []))
+
+
+def _texto(binario) -> io.TextIOWrapper:
+    """Decodifica um fluxo binário como texto UTF-8 (com ou sem BOM)"""
+    return io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+
+
+def _iterar_csv(abrir: Callable, coluna_cnpj: str, origem: str) -> Iterator[str]:
+    """
+    Lê a coluna de CNPJs de um CSV como texto, preservando zeros à esquerda
+    abrir: função que devolve um novo fluxo binário do conteúdo
+    """
+    with _texto(abrir()) as f:
+        colunas = _normalizar_colunas(next(csv.reader(f), []))
+    if coluna_cnpj not in colunas:
+        raise ValueError(
+            f"Coluna '{coluna_cnpj}' não encontrada no CSV {origem}. "
+            f"Colunas disponíveis: {colunas}"
+        )
+    indice = colunas.index(coluna_cnpj)
+
+    def gerar():
+        with _texto(abrir()) as f:
+            leitor = csv.reader(f)
+            next(leitor, None)
+            for linha in leitor:
+                # Linhas em branco são ignoradas, como no pandas
+                if not linha:
+                    continue
+                yield linha[indice] if indice < len(linha) else ''
+
+    return gerar()
+
+
+def _iterar_txt_mmap(arquivo: str) -> Iterator[str]:
+    """
+    Lê um CNPJ por linha percorrendo o arquivo mapeado em memória
+    O mapa é fatiado em blocos terminados em quebra de linha, e cada bloco é
+    dividido de uma vez (bem mais rápido que ler linha a linha)
+    """
+    with open(arquivo, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+        if tamanho == 0:
+            return  # mmap não aceita arquivos vazios
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            inicio = 0
+            while inicio < tamanho:
+                fim = min(inicio + TAMANHO_BLOCO_TXT, tamanho)
+                if fim < tamanho:
+                    quebra = mapa.rfind(b'\n', inicio, fim)
+                    if quebra < 0:
+                        # Linha maior que o bloco: estende até a próxima quebra
+                        quebra = mapa.find(b'\n', fim)
+                    fim = quebra + 1 if quebra >= 0 else tamanho
+                for linha in mapa[inicio:fim].split(b'\n'):
+                    linha = linha.strip()
+                    if linha:
+                        yield linha.decode('utf-8')
+                inicio = fim
+
+
+def _iterar_txt(abrir: Callable) -> Iterator[str]:
+    """Lê um CNPJ por linha de um fluxo binário, ignorando linhas vazias"""
+    with abrir() as f:
+        for linha in f:
+            linha = linha.strip()
+            if linha:
+                yield linha.decode('utf-8')
+
+
+def _valor_celula(valor) -> str:
+    """Converte uma célula do Excel em texto (CNPJs numéricos perdem os zeros à esquerda)"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _iterar_xlsx(abrir: Callable, coluna_cnpj: str, origem: str) -> Iterator[str]:
+    """
+    Lê a coluna de CNPJs da primeira planilha de um XLSX, linha a linha
+    abrir: função que devolve o caminho ou um novo fluxo binário (com seek) do conteúdo
+    """
+    if openpyxl is None:
+        raise ValueError("A leitura de arquivos .xlsx requer o pacote openpyxl (pip install openpyxl)")
+
+    def abrir_planilha():
+        # read_only: as linhas são lidas sob demanda, sem carregar a planilha inteira
+        pasta = openpyxl.load_workbook(abrir(), read_only=True, data_only=True)
+        return pasta, pasta.worksheets[0].iter_rows(values_only=True)
+
+    pasta, linhas = abrir_planilha()
+    try:
+        colunas = _normalizar_colunas(_valor_celula(valor) for valor in next(linhas, ()))
+    finally:
+        pasta.close()
+    if coluna_cnpj not in colunas:
+        raise ValueError(
+            f"Coluna '{coluna_cnpj}' não encontrada na planilha {origem}. "
+            f"Colunas disponíveis: {colunas}"
+        )
+    indice = colunas.index(coluna_cnpj)
+
+    def gerar():
+        pasta, linhas = abrir_planilha()
+        try:
+            next(linhas, None)
+            for linha in linhas:
+                if not linha or all(valor is None for valor in linha):
+                    continue
+                yield _valor_celula(linha[indice]) if indice < len(linha) else ''
+        finally:
+            pasta.close()
+
+    return gerar()
+
+
+def _membros_zip(arquivo: str) -> List[str]:
+    """Membros do ZIP em formato suportado, na ordem do arquivo"""
+    try:
+        with zipfile.ZipFile(arquivo) as zip_entrada:
+            membros = [
+                info.filename for info in zip_entrada.infolist()
+                if not info.is_dir() and detectar_formato(info.filename) in FORMATOS_ZIP
+            ]
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Arquivo ZIP inválido {arquivo}: {str(e)}")
+    if not membros:
+        raise ValueError(
+            f"Nenhum arquivo suportado dentro de {arquivo}. "
+            f"Formatos aceitos no ZIP: {', '.join(FORMATOS_ZIP)}"
+        )
+    return membros
+
+
+def _iterar_membro(zip_entrada: zipfile.ZipFile, membro: str, coluna_cnpj: str) -> Iterator[str]:
+    """Itera sobre os CNPJs de um membro do ZIP, descompactando em streaming"""
+    extensao = detectar_formato(membro)
+    origem = f"{zip_entrada.filename}:{membro}"
+
+    if extensao == '.csv':
+        return _iterar_csv(lambda: zip_entrada.open(membro), coluna_cnpj, origem)
+    elif extensao == '.csv.gz':
+        return _iterar_csv(lambda: gzip.open(zip_entrada.open(membro)), coluna_cnpj, origem)
+    elif extensao == '.txt':
+        return _iterar_txt(lambda: zip_entrada.open(membro))
+    elif extensao == '.txt.gz':
+        return _iterar_txt(lambda: gzip.open(zip_entrada.open(membro)))
+    return _iterar_xlsx(lambda: zip_entrada.open(membro), coluna_cnpj, origem)
+
+
+def _iterar_zip(arquivo: str, coluna_cnpj: str) -> Iterator[str]:
+    """Lê em sequência os CNPJs de todos os membros suportados de um ZIP"""
+    membros = _membros_zip(arquivo)
+
+    # Valida a coluna de todos os membros antes de começar a entregar valores
+    with zipfile.ZipFile(arquivo) as zip_entrada:
+        for membro in membros:
+            iterador = _iterar_membro(zip_entrada, membro, coluna_cnpj)
+            if hasattr(iterador, 'close'):
+                iterador.close()
+
+    def gerar():
+        with zipfile.ZipFile(arquivo) as zip_entrada:
+            for membro in membros:
+                yield from _iterar_membro(zip_entrada, membro, coluna_cnpj)
+
+    return gerar()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rate limit compartilhado entre processos
+Todos os processos (menu, lotes, prefetch) disputam a mesma quota da API
+através de um banco SQLite: o horário da última consulta e as sessões ativas
+ficam no banco, e cada aquisição de vaga é feita em uma transação exclusiva.
+A cada vaga, o escalonador escolhe entre as sessões que estão aguardando:
+1. classe de prioridade (interativa > lote > fundo)
+2. dentro da classe, o prazo mais próximo (sessões sem prazo por último)
+3. empate: a sessão que usou a quota há mais tempo (revezamento justo entre lotes)
+Sessões de fundo só consultam quando nenhuma sessão de outra classe está ativa.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+# Prioridades (menor número = maior prioridade)
+PRIORIDADE_INTERATIVA = 0
+PRIORIDADE_LOTE = 1
+PRIORIDADE_FUNDO = 2
+
+# Nomes das classes de prioridade aceitos na linha de comando
+CLASSES_PRIORIDADE = {
+    'interativa': PRIORIDADE_INTERATIVA,
+    'lote': PRIORIDADE_LOTE,
+    'fundo': PRIORIDADE_FUNDO,
+}
+
+# Sessões sem sinal de vida há mais que isso são descartadas (processo encerrado)
+VALIDADE_SESSAO_SEGUNDOS = 30
+
+# Intervalo máximo entre verificações enquanto aguarda a vez
+INTERVALO_VERIFICACAO = 0.25
+
+
+class LimitadorCompartilhado:
+    """
+    Distribui as vagas de consulta da API entre processos respeitando prioridades
+    """
+
+    def __init__(self, arquivo: str = 'limitador_cnpj.db'):
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        # isolation_level=None: as transações são controladas explicitamente (BEGIN IMMEDIATE)
+        self._conexao = sqlite3.connect(arquivo, timeout=30, isolation_level=None,
+                                        check_same_thread=False)
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS estado (chave TEXT PRIMARY KEY, valor REAL NOT NULL)"
+        )
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS sessoes ("
+            " id TEXT PRIMARY KEY,"
+            " prioridade INTEGER NOT NULL,"
+            " aguardando_desde REAL,"
+            " sinal_de_vida REAL NOT NULL,"
+            " prazo REAL,"
+            " ultimo_uso REAL NOT NULL DEFAULT 0)"
+        )
+        # Bancos criados antes do escalonador não têm as colunas de prazo e revezamento
+        colunas = {linha[1] for linha in self._conexao.execute("PRAGMA table_info(sessoes)")}
+        if 'prazo' not in colunas:
+            self._conexao.execute("ALTER TABLE sessoes ADD COLUMN prazo REAL")
+        if 'ultimo_uso' not in colunas:
+            self._conexao.execute("ALTER TABLE sessoes ADD COLUMN ultimo_uso REAL NOT NULL DEFAULT 0")
+
+    def nova_sessao(self) -> str:
+        """Gera um identificador único de sessão para este processo"""
+        return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _bloqueado(self, sessao: str, prioridade: int) -> bool:
+        """Indica se outra sessão tem preferência sobre esta na próxima vaga"""
+        if prioridade >= PRIORIDADE_FUNDO:
+            # Sessões de fundo só usam a quota quando nenhuma outra sessão está ativa
+            if self._conexao.execute(
+                "SELECT 1 FROM sessoes WHERE id != ? AND prioridade < ? LIMIT 1",
+                (sessao, prioridade)
+            ).fetchone() is not None:
+                return True
+
+        escolhida = self._conexao.execute(
+            "SELECT id FROM sessoes WHERE aguardando_desde IS NOT NULL"
+            " ORDER BY prioridade, prazo IS NULL, prazo, ultimo_uso, aguardando_desde, id"
+            " LIMIT 1"
+        ).fetchone()
+        return escolhida is not None and escolhida[0] != sessao
+
+    def adquirir(self, sessao: str, prioridade: int, intervalo: float,
+                 prazo: Optional[float] = None,
+                 parar: Optional[threading.Event] = None) -> Optional[float]:
+        """
+        Bloqueia até a sessão poder fazer uma consulta e registra o horário de uso
+        prazo: horário (time.time()) até o qual o trabalho da sessão deveria terminar
+        parar: evento que interrompe a espera sem ocupar a vaga
+        Retorna o tempo aguardado em segundos, ou None se a espera foi interrompida
+        """
+        inicio = time.time()
+
+        while True:
+            with self._lock:
+                self._conexao.execute("BEGIN IMMEDIATE")
+                try:
+                    agora = time.time()
+                    self._conexao.execute(
+                        "DELETE FROM sessoes WHERE sinal_de_vida < ?",
+                        (agora - VALIDADE_SESSAO_SEGUNDOS,)
+                    )
+                    linha = self._conexao.execute(
+                        "SELECT aguardando_desde, ultimo_uso FROM sessoes WHERE id = ?", (sessao,)
+                    ).fetchone()
+                    desde = linha[0] if linha and linha[0] is not None else agora
+                    ultimo_uso = linha[1] if linha else 0.0
+                    self._conexao.execute(
+                        "INSERT OR REPLACE INTO sessoes"
+                        " (id, prioridade, aguardando_desde, sinal_de_vida, prazo, ultimo_uso)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (sessao, prioridade, desde, agora, prazo, ultimo_uso)
+                    )
+
+                    linha = self._conexao.execute(
+                        "SELECT valor FROM estado WHERE chave = 'ultima_consulta'"
+                    ).fetchone()
+                    ultima = linha[0] if linha else 0.0
+                    restante = intervalo - (agora - ultima)
+
+                    if restante <= 0 and not self._bloqueado(sessao, prioridade):
+                        self._conexao.execute(
+                            "INSERT OR REPLACE INTO estado (chave, valor) VALUES ('ultima_consulta', ?)",
+                            (agora,)
+                        )
+                        self._conexao.execute(
+                            "UPDATE sessoes SET aguardando_desde = NULL, ultimo_uso = ? WHERE id = ?",
+                            (agora, sessao)
+                        )
+                        self._conexao.execute("COMMIT")
+                        return agora - inicio
+
+                    self._conexao.execute("COMMIT")
+                except Exception:
+                    self._conexao.execute("ROLLBACK")
+                    raise
+
+            pausa = min(max(restante, 0.05), INTERVALO_VERIFICACAO)
+            if parar is None:
+                time.sleep(pausa)
+            elif parar.wait(pausa):
+                return None
+
+    def sessoes_ativas(self) -> List[Tuple[str, int, Optional[float]]]:
+        """Lista (sessão, prioridade, prazo) das sessões com sinal de vida recente"""
+        with self._lock:
+            return self._conexao.execute(
+                "SELECT id, prioridade, prazo FROM sessoes WHERE sinal_de_vida >= ?"
+                " ORDER BY prioridade, prazo IS NULL, prazo",
+                (time.time() - VALIDADE_SESSAO_SEGUNDOS,)
+            ).fetchall()
+
+    def encerrar_sessao(self, sessao: str):
+        """Remove a sessão, liberando a quota para as sessões de menor prioridade"""
+        with self._lock:
+            self._conexao.execute("DELETE FROM sessoes WHERE id = ?", (sessao,))
+
+    def fechar(self):
+        """Fecha a conexão com o banco do limitador"""
+        with self._lock:
+            self._conexao.close()
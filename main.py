@@ -6,9 +6,37 @@ Consulta automatizada de CNPJs através da API CNPJA
 Limitado a 5 consultas por minuto conforme especificação da API
 """
 
+import argparse
 import os
 import sys
+import time
+from contextlib import nullcontext
+from arquivo_payloads import ArquivoPayloads
+from cache_cnpj import CacheCNPJ
 from consultor_simples import ConsultorCNPJA
+from enriquecimento import CAMPOS_PADRAO
+from eventos import NIVEIS, RegistroEventos
+from indice_empresas import IndiceEmpresas
+from leitores import detectar_formato
+from limitador import CLASSES_PRIORIDADE, PRIORIDADE_INTERATIVA, LimitadorCompartilhado
+from perfilador import MODOS_PERFIL, Perfilador, prefixo_relatorios
+from prefetch import PrefetchCNPJ
+from quota_adaptativa import ControladorQuota
+from transporte import TransporteReproducao, criar_transporte
+from planejador import exibir_plano
+
+def criar_consultor(transporte=None, quota_adaptativa: bool = True):
+    """
+    Cria o consultor usando o cache local, o arquivo de auditoria e o índice de empresas
+    Com quota_adaptativa, a taxa de consultas parte da última taxa segura aprendida
+    """
+    if isinstance(transporte, TransporteReproducao):
+        # Reprodução determinística: não lê nem altera cache, índice ou auditoria
+        return ConsultorCNPJA(transporte=transporte)
+    return ConsultorCNPJA(cache=CacheCNPJ(), arquivo_payloads=ArquivoPayloads(),
+                          indice=IndiceEmpresas(), transporte=transporte,
+                          limitador=LimitadorCompartilhado(),
+                          quota=ControladorQuota() if quota_adaptativa else None)
 
 def menu_principal():
     """Exibe o menu principal do sistema"""
@@ -20,12 +48,13 @@ def menu_principal():
     print("3. Processar arquivo TXT com múltiplos CNPJs")
     print("4. Criar arquivo CSV de exemplo")
     print("5. Criar arquivo TXT de exemplo")
-    print("6. Sair")
+    print("6. Planejar processamento (estimativa de tempo e consultas)")
+    print("7. Sair")
     print("="*60)
 
 def consultar_cnpj_individual():
     """Função para consultar um CNPJ específico"""
-    consultor = ConsultorCNPJA()
+    consultor = criar_consultor()
     
     print("\n--- CONSULTA INDIVIDUAL ---")
     cnpj = input("Digite o CNPJ (com ou sem formatação): ").strip()
@@ -37,7 +66,10 @@ def consultar_cnpj_individual():
     print(f"\nIniciando consulta para CNPJ: {cnpj}")
     print("-" * 40)
     
+    # Consulta interativa passa à frente de lotes e do prefetch na quota compartilhada
+    consultor.prioridade = PRIORIDADE_INTERATIVA
     resultado = consultor.consultar_cnpj(cnpj)
+    consultor.encerrar_sessao()
     
     if resultado:
         print("\n✓ CONSULTA REALIZADA COM SUCESSO!")
@@ -73,7 +105,7 @@ def consultar_cnpj_individual():
 
 def processar_csv():
     """Função para processar arquivo CSV com múltiplos CNPJs"""
-    consultor = ConsultorCNPJA()
+    consultor = criar_consultor()
     
     print("\n--- PROCESSAMENTO DE ARQUIVO CSV ---")
     
@@ -136,7 +168,7 @@ def processar_csv():
 
 def processar_txt():
     """Função para processar arquivo TXT com múltiplos CNPJs"""
-    consultor = ConsultorCNPJA()
+    consultor = criar_consultor()
     
     print("\n--- PROCESSAMENTO DE ARQUIVO TXT ---")
     
@@ -194,6 +226,25 @@ def processar_txt():
         print(f"Portes encontrados: {portes}")
         print(f"Taxa de sucesso: {(sucesso/total)*100:.1f}%")
 
+def planejar_processamento():
+    """Estima consultas e tempo de um lote sem consultar a API"""
+    consultor = criar_consultor()
+    
+    print("\n--- PLANEJAMENTO DE PROCESSAMENTO ---")
+    
+    arquivo = input("Digite o nome do arquivo (CSV, TXT, XLSX, .gz ou ZIP): ").strip()
+    if not arquivo:
+        print("Nome do arquivo não pode estar vazio!")
+        return
+    
+    coluna_cnpj = 'cnpj'
+    if detectar_formato(arquivo) != '.txt':
+        coluna_cnpj = input("Nome da coluna com os CNPJs (padrão: 'cnpj'): ").strip() or 'cnpj'
+    
+    plano = consultor.planejar_arquivo(arquivo, coluna_cnpj)
+    if plano:
+        exibir_plano(plano)
+
 def criar_csv_exemplo():
     """Cria um arquivo CSV de exemplo"""
     print("\n--- CRIAR ARQUIVO CSV DE EXEMPLO ---")
@@ -277,6 +328,8 @@ def main():
             elif opcao == '5':
                 criar_txt_exemplo()
             elif opcao == '6':
+                planejar_processamento()
+            elif opcao == '7':
                 print("\nSaindo do sistema...")
                 break
             else:
@@ -292,6 +345,232 @@ def main():
             print(f"\nErro inesperado: {str(e)}")
             input("Pressione Enter para continuar...")
 
+def consultar_indice(consultor, args):
+    """Executa o subcomando 'indice' (filtros sobre os CNPJs já consultados)"""
+    if args.reindexar:
+        total = consultor.indice.registrar_varios(consultor.cache.iterar())
+        print(f"✓ {total} CNPJs do cache indexados")
+    
+    filtros = {
+        'uf': args.uf, 'municipio': args.municipio, 'porte': args.porte,
+        'cnae': args.cnae, 'situacao': args.situacao, 'raiz': args.raiz,
+    }
+    
+    inicio = time.time()
+    if args.contar:
+        print(f"CNPJs encontrados: {consultor.indice.contar(**filtros)}")
+    else:
+        cnpjs = consultor.indice.consultar(limite=args.limite, **filtros)
+        for cnpj in cnpjs:
+            print(cnpj)
+        print(f"CNPJs encontrados: {len(cnpjs)}")
+    print(f"(consulta em {(time.time() - inicio) * 1000:.1f} ms)")
+
+def etapa_perfil(consultor, nome: str):
+    """Bloco medido como etapa pelo perfilador (sem efeito fora do modo --profile)"""
+    if consultor.perfilador is None:
+        return nullcontext()
+    return consultor.perfilador.etapa(nome)
+
+def preparar_perfil(consultor, args) -> Perfilador:
+    """Cria o perfilador do lote; os relatórios ficam ao lado do arquivo de saída"""
+    if args.comando == 'processar' and not args.saida:
+        # Define o nome padrão aqui para que saída e relatórios compartilhem o prefixo
+        args.saida = consultor._nome_arquivo_saida()
+        if args.particionar_por:
+            args.saida = os.path.splitext(args.saida)[0]
+    saida = args.saida or f"{os.path.splitext(args.original)[0]}_enriquecido.csv"
+    modos = [modo.strip() for modo in args.modos_perfil.split(',') if modo.strip()]
+    return Perfilador(prefixo_relatorios(saida), modos)
+
+def executar_comando(consultor, args):
+    """Executa o subcomando já interpretado; retorna o código de saída"""
+    if args.comando == 'planejar':
+        plano = consultor.planejar_arquivo(args.arquivo, args.coluna)
+        if not plano:
+            return 1
+        exibir_plano(plano)
+    elif args.comando == 'processar':
+        consultor.prioridade = CLASSES_PRIORIDADE[args.prioridade]
+        consultor.definir_prazo(args.prazo_minutos)
+        if args.particionar_por:
+            with etapa_perfil(consultor, 'processar_arquivo'):
+                resultados = consultor.processar_arquivo(args.arquivo, args.coluna, args.limite_memoria_mb)
+            if not resultados:
+                return 1
+            with etapa_perfil(consultor, 'salvar_resultados'):
+                consultor.salvar_resultados(resultados, args.saida, args.particionar_por,
+                                            args.linhas_por_particao)
+        else:
+            with etapa_perfil(consultor, 'processar_e_salvar'):
+                estatisticas = consultor.processar_e_salvar(args.arquivo, args.saida, args.coluna,
+                                                            args.limite_memoria_mb)
+            if estatisticas is None:
+                return 1
+    elif args.comando == 'exportar-payloads':
+        if consultor.arquivo_payloads is None:
+            print("✗ O arquivo de auditoria não é usado no modo de reprodução")
+            return 1
+        total = consultor.arquivo_payloads.exportar_jsonl(args.destino)
+        print(f"✓ {total} respostas exportadas para {args.destino}")
+    elif args.comando == 'enriquecer':
+        saida = args.saida or f"{os.path.splitext(args.original)[0]}_enriquecido.csv"
+        campos = [campo.strip() for campo in args.campos.split(',')] if args.campos else None
+        with etapa_perfil(consultor, 'enriquecer_arquivo'):
+            relatorio = consultor.enriquecer_arquivo(args.original, saida, args.coluna, campos,
+                                                     arquivo_resultados=args.resultados)
+        if relatorio is None:
+            return 1
+    elif args.comando == 'prefetch':
+        if consultor.cache is None:
+            print("✗ O prefetch não é usado no modo de reprodução")
+            return 1
+        prefetch = PrefetchCNPJ(consultor, args.renovar_dias)
+        print(f"Lista de observação: {prefetch.carregar_lista(args.arquivos, args.coluna)} CNPJs")
+        prefetch.executar(args.ciclos, args.pausa)
+    elif args.comando == 'indice':
+        if consultor.indice is None:
+            print("✗ O índice de empresas não é usado no modo de reprodução")
+            return 1
+        consultar_indice(consultor, args)
+    
+    return 0
+
+def adicionar_opcoes_perfil(subcomando):
+    """Opções do modo de perfil, comuns aos subcomandos de lote"""
+    subcomando.add_argument('--profile', action='store_true',
+                            help="Gera relatórios de CPU, memória e amostragem ao lado da saída")
+    subcomando.add_argument('--modos-perfil', default=','.join(MODOS_PERFIL),
+                            help="Ferramentas do --profile separadas por vírgula (padrão: %s)"
+                            % ','.join(MODOS_PERFIL))
+
+def executar_cli(argumentos):
+    """Executa os subcomandos de linha de comando (uso não interativo)"""
+    parser = argparse.ArgumentParser(
+        description="Sistema de Consulta CNPJ - Brasil API"
+    )
+    gravacao = parser.add_mutually_exclusive_group()
+    gravacao.add_argument('--gravar', metavar='ARQUIVO',
+                          help="Grava as respostas da API para reprodução posterior")
+    gravacao.add_argument('--reproduzir', metavar='ARQUIVO',
+                          help="Responde a partir de uma gravação, sem rede e sem rate limit")
+    parser.add_argument('--quota-fixa', action='store_true',
+                        help="Usa o limite fixo de 5 consultas/min em vez da quota aprendida")
+    parser.add_argument('--verboso', action='store_true',
+                        help="Exibe as mensagens de cada linha em vez da linha de progresso")
+    parser.add_argument('--log-eventos', metavar='ARQUIVO',
+                        help="Grava os eventos estruturados (JSON Lines) neste arquivo")
+    parser.add_argument('--nivel-log', choices=list(NIVEIS), default='info',
+                        help="Nível mínimo dos eventos gravados (padrão: info)")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    
+    planejar = subcomandos.add_parser(
+        'planejar', help="Estima consultas à API e tempo de um lote sem consultar a API"
+    )
+    planejar.add_argument('arquivo', help="Arquivo CSV, TXT, XLSX, .csv.gz/.txt.gz ou ZIP com os CNPJs")
+    planejar.add_argument('--coluna', default='cnpj', help="Coluna com os CNPJs (padrão: cnpj)")
+    
+    processar = subcomandos.add_parser(
+        'processar', help="Processa um lote gravando os resultados em CSV à medida que ficam prontos"
+    )
+    processar.add_argument('arquivo', help="Arquivo CSV, TXT, XLSX, .csv.gz/.txt.gz ou ZIP com os CNPJs")
+    processar.add_argument('--coluna', default='cnpj', help="Coluna com os CNPJs (padrão: cnpj)")
+    processar.add_argument('--saida', help="Arquivo CSV de saída (padrão: resultados_cnpj_<timestamp>.csv)")
+    processar.add_argument('--limite-memoria-mb', type=float,
+                           help="Deduplica em disco respeitando este teto de memória (entradas muito grandes)")
+    processar.add_argument('--particionar-por', choices=['uf', 'porte', 'linhas'],
+                           help="Grava um diretório com um CSV por partição e manifesto (mantém os resultados em memória)")
+    processar.add_argument('--linhas-por-particao', type=int, default=100000,
+                           help="Linhas por arquivo com --particionar-por linhas (padrão: 100000)")
+    processar.add_argument('--prioridade', choices=sorted(CLASSES_PRIORIDADE), default='lote',
+                           help="Classe de prioridade na quota compartilhada (padrão: lote)")
+    processar.add_argument('--prazo-minutos', type=float,
+                           help="Prazo do lote; entre lotes da mesma classe, o prazo mais próximo consulta primeiro")
+    
+    adicionar_opcoes_perfil(processar)
+    
+    exportar = subcomandos.add_parser(
+        'exportar-payloads', help="Exporta as respostas brutas arquivadas para JSON Lines"
+    )
+    exportar.add_argument('destino', help="Arquivo .jsonl de destino")
+    
+    indice = subcomandos.add_parser(
+        'indice', help="Lista CNPJs já consultados que atendem aos filtros (ex: --uf SP --porte ME)"
+    )
+    indice.add_argument('--uf', help="Unidade federativa (ex: SP)")
+    indice.add_argument('--municipio', help="Município (ex: 'SAO PAULO')")
+    indice.add_argument('--porte', help="Porte (ME, EPP, DEMAIS ou o texto da API)")
+    indice.add_argument('--cnae', help="CNAE fiscal completo ou prefixo (ex: 6201-5)")
+    indice.add_argument('--situacao', help="Situação cadastral (ex: ATIVA)")
+    indice.add_argument('--raiz', help="Raiz do CNPJ (8 primeiros dígitos)")
+    indice.add_argument('--limite', type=int, help="Número máximo de CNPJs listados")
+    indice.add_argument('--contar', action='store_true', help="Exibe apenas a quantidade")
+    indice.add_argument('--reindexar', action='store_true',
+                        help="Reconstrói o índice a partir do cache local antes de consultar")
+    
+    enriquecer = subcomandos.add_parser(
+        'enriquecer', help="Acrescenta campos dos resultados ao CSV original do cliente"
+    )
+    enriquecer.add_argument('original', help="CSV original (todas as colunas são preservadas)")
+    enriquecer.add_argument('resultados', help="CSV de resultados gerado pelo processamento")
+    enriquecer.add_argument('--saida', help="CSV de saída (padrão: <original>_enriquecido.csv)")
+    enriquecer.add_argument('--coluna', default='cnpj', help="Coluna com os CNPJs (padrão: cnpj)")
+    enriquecer.add_argument('--campos', help="Campos separados por vírgula (padrão: %s)"
+                            % ','.join(CAMPOS_PADRAO))
+    
+    adicionar_opcoes_perfil(enriquecer)
+    
+    prefetch = subcomandos.add_parser(
+        'prefetch', help="Mantém o cache aquecido para uma lista de CNPJs, usando a quota ociosa"
+    )
+    prefetch.add_argument('arquivos', nargs='+', help="Arquivos CSV/TXT com os CNPJs observados")
+    prefetch.add_argument('--coluna', default='cnpj', help="Coluna com os CNPJs (padrão: cnpj)")
+    prefetch.add_argument('--renovar-dias', type=float, default=20,
+                          help="Renova entradas do cache mais antigas que isso (padrão: 20)")
+    prefetch.add_argument('--ciclos', type=int, help="Número de ciclos (padrão: contínuo)")
+    prefetch.add_argument('--pausa', type=float, default=300,
+                          help="Segundos entre ciclos (padrão: 300)")
+    
+    args = parser.parse_args(argumentos)
+    
+    try:
+        if args.reproduzir:
+            transporte = criar_transporte('reproduzir', args.reproduzir)
+            print(f"Reproduzindo {len(transporte)} respostas gravadas em {args.reproduzir}")
+        else:
+            transporte = criar_transporte('gravar' if args.gravar else None, args.gravar)
+    except (OSError, ValueError) as e:
+        print(f"✗ Não foi possível preparar o transporte: {str(e)}")
+        return 1
+    consultor = criar_consultor(transporte, quota_adaptativa=not args.quota_fixa)
+    
+    consultor.verboso = args.verboso
+    try:
+        consultor.eventos = RegistroEventos(args.log_eventos, args.nivel_log, console=True)
+    except OSError as e:
+        print(f"✗ Não foi possível abrir o arquivo de eventos: {str(e)}")
+        return 1
+    
+    if getattr(args, 'profile', False):
+        try:
+            consultor.perfilador = preparar_perfil(consultor, args)
+        except ValueError as e:
+            print(f"✗ {str(e)}")
+            consultor.eventos.fechar()
+            return 1
+        consultor.perfilador.iniciar()
+    
+    try:
+        return executar_comando(consultor, args)
+    finally:
+        if consultor.perfilador is not None:
+            print("\nRelatórios de perfil:")
+            for arquivo in consultor.perfilador.finalizar():
+                print(f"  {arquivo}")
+        consultor.eventos.fechar()
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(executar_cli(sys.argv[1:]))
     print("Iniciando Sistema de Consulta CNPJ - Brasil API...")
     main()
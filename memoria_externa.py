@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ordenação e deduplicação em memória externa para entradas maiores que a RAM
+Os CNPJs são empacotados como inteiros de 64 bits junto com o índice da linha.
+Quando o buffer atinge o limite de memória, ele é ordenado e gravado em disco
+(um "run"); no final os runs são intercalados (k-way merge) em ordem.
+"""
+
+import heapq
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from array import array
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tabelas_referencia import DadosCompactos, TabelasReferencia
+
+# O índice da linha ocupa os 40 bits menos significativos da chave combinada
+BITS_INDICE = 40
+MASCARA_INDICE = (1 << BITS_INDICE) - 1
+
+# Custo aproximado de um registro no buffer (int Python + ponteiro na lista)
+BYTES_POR_REGISTRO = 64
+
+# Registros lidos por vez de cada run durante a intercalação
+REGISTROS_POR_BLOCO = 8192
+
+
+class OrdenadorExterno:
+    """
+    Ordena pares (cnpj, indice) respeitando um teto de memória
+    Use como gerenciador de contexto para remover os arquivos temporários
+    """
+
+    def __init__(self, limite_memoria_mb: float = 256, diretorio: Optional[str] = None):
+        self.capacidade = max(1024, int(limite_memoria_mb * 1024 * 1024 / BYTES_POR_REGISTRO))
+        self._diretorio = tempfile.mkdtemp(prefix='ordenacao_cnpj_', dir=diretorio)
+        self._buffer = []
+        self._runs = []
+        self.total = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def adicionar(self, cnpj: int, indice: int):
+        """Adiciona um CNPJ (como inteiro) e o índice da linha de origem"""
+        self._buffer.append((cnpj << BITS_INDICE) | indice)
+        self.total += 1
+        if len(self._buffer) >= self.capacidade:
+            self._despejar()
+
+    def _despejar(self):
+        """Ordena o buffer e grava como um run binário de inteiros de 64 bits"""
+        self._buffer.sort()
+        caminho = os.path.join(self._diretorio, f"run_{len(self._runs):05d}.bin")
+        registros = array('q')
+        for chave in self._buffer:
+            registros.append(chave >> BITS_INDICE)
+            registros.append(chave & MASCARA_INDICE)
+        with open(caminho, 'wb') as f:
+            registros.tofile(f)
+        self._runs.append(caminho)
+        self._buffer = []
+
+    def _ler_run(self, caminho: str) -> Iterator[int]:
+        with open(caminho, 'rb') as f:
+            while True:
+                bloco = array('q')
+                try:
+                    bloco.fromfile(f, REGISTROS_POR_BLOCO * 2)
+                except EOFError:
+                    # fromfile lê o que restou antes de levantar EOFError
+                    pass
+                if not bloco:
+                    return
+                for i in range(0, len(bloco), 2):
+                    yield (bloco[i] << BITS_INDICE) | bloco[i + 1]
+
+    def ordenados(self) -> Iterator[Tuple[int, int]]:
+        """Itera sobre todos os pares (cnpj, indice) em ordem crescente"""
+        self._buffer.sort()
+        fontes = [self._ler_run(caminho) for caminho in self._runs]
+        fontes.append(iter(self._buffer))
+        for chave in heapq.merge(*fontes):
+            yield chave >> BITS_INDICE, chave & MASCARA_INDICE
+
+    @property
+    def runs_em_disco(self) -> int:
+        """Quantidade de runs gravados em disco até o momento"""
+        return len(self._runs)
+
+    def fechar(self):
+        """Remove os arquivos temporários"""
+        self._buffer = []
+        shutil.rmtree(self._diretorio, ignore_errors=True)
+
+
+def deduplicar(pares_ordenados) -> Iterator[Tuple[int, int, int]]:
+    """
+    Recebe pares (cnpj, indice) ordenados e retorna (cnpj, primeiro_indice, ocorrencias)
+    """
+    for cnpj, grupo in groupby(pares_ordenados, key=lambda par: par[0]):
+        primeiro = next(grupo)[1]
+        yield cnpj, primeiro, 1 + sum(1 for _ in grupo)
+
+
+def agrupar_por_raiz(unicos) -> Iterator[Tuple[int, List[Tuple[int, int, int]]]]:
+    """
+    Agrupa CNPJs únicos ordenados pela raiz (8 primeiros dígitos = mesma empresa)
+    Como a entrada está ordenada, os estabelecimentos da mesma empresa são vizinhos
+    """
+    for raiz, grupo in groupby(unicos, key=lambda item: item[0] // 1000000):
+        yield raiz, list(grupo)
+
+
+class ResultadosTemporarios:
+    """
+    Guarda em disco o resultado da consulta de cada CNPJ único
+    Permite remontar a saída na ordem original sem manter os dados em memória
+    """
+
+    def __init__(self, diretorio: Optional[str] = None,
+                 tabelas: Optional[TabelasReferencia] = None):
+        self._diretorio = tempfile.mkdtemp(prefix='resultados_cnpj_', dir=diretorio)
+        # Com as tabelas de referência, os dados são guardados e devolvidos compactados
+        self.tabelas = tabelas
+        self._conexao = sqlite3.connect(
+            os.path.join(self._diretorio, 'resultados.db'), check_same_thread=False
+        )
+        self._conexao.execute(
+            "CREATE TABLE resultados ("
+            " cnpj INTEGER PRIMARY KEY,"
+            " dados TEXT,"
+            " motivo_falha TEXT)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def gravar(self, resultado: Dict):
+        """Grava o resultado de um CNPJ (um dicionário como os de processar_arquivo)"""
+        dados = resultado['dados_completos']
+        if dados is not None and self.tabelas is not None:
+            dados = self.tabelas.compactar(dados).compactos()
+        self._conexao.execute(
+            "INSERT OR REPLACE INTO resultados (cnpj, dados, motivo_falha) VALUES (?, ?, ?)",
+            (int(resultado['cnpj_limpo']),
+             json.dumps(dados, ensure_ascii=False) if dados is not None else None,
+             resultado.get('motivo_falha'))
+        )
+
+    def obter(self, cnpj: int) -> Optional[Tuple[Optional[Dict], Optional[str]]]:
+        """Retorna (dados, motivo_falha) do CNPJ ou None se ele não foi consultado"""
+        linha = self._conexao.execute(
+            "SELECT dados, motivo_falha FROM resultados WHERE cnpj = ?", (cnpj,)
+        ).fetchone()
+        if linha is None:
+            return None
+        if linha[0] is None:
+            return None, linha[1]
+        dados = json.loads(linha[0])
+        if self.tabelas is not None:
+            dados = DadosCompactos(dados, self.tabelas)
+        return dados, linha[1]
+
+    def fechar(self):
+        """Fecha o banco e remove os arquivos temporários"""
+        self._conexao.close()
+        shutil.rmtree(self._diretorio, ignore_errors=True)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saída particionada dos resultados
+Em vez de um único CSV com milhões de linhas, os resultados são divididos em
+partições (por UF, por porte ou em blocos de N linhas) gravadas em paralelo em
+um diretório. O manifesto (manifesto.json) lista cada partição com a
+quantidade de linhas e o SHA-256 do arquivo, permitindo ler só as partições
+necessárias e conferir sua integridade.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+# Critérios de particionamento: nome -> coluna do CSV de resultados (None = blocos de linhas)
+CRITERIOS_PARTICAO = {
+    'uf': 'uf',
+    'porte': 'porte',
+    'linhas': None,
+}
+
+# Partição das linhas sem valor na coluna do critério (ex: consultas que falharam)
+VALOR_AUSENTE = 'sem_valor'
+
+# Linhas por partição no critério 'linhas'
+LINHAS_POR_PARTICAO = 100000
+
+TAMANHO_BLOCO_HASH = 1 << 20
+
+
+def _nome_particao(valor: str) -> str:
+    """Nome de arquivo seguro para o valor da partição (ex: 'MICRO EMPRESA' -> 'MICRO_EMPRESA')"""
+    return re.sub(r'[^0-9A-Za-z]+', '_', valor).strip('_') or VALOR_AUSENTE
+
+
+def _nome_unico(valor: str, usados: set) -> str:
+    """
+    Nome de arquivo da partição sem colisão com os já usados (ex: 'A B' e 'A-B')
+    A comparação ignora maiúsculas, como nos sistemas de arquivos do Windows
+    """
+    nome = _nome_particao(valor)
+    if nome.lower() in usados:
+        nome = f"{nome}_{hashlib.sha1(valor.encode('utf-8')).hexdigest()[:8]}"
+        base, contador = nome, 2
+        while nome.lower() in usados:
+            nome = f"{base}_{contador}"
+            contador += 1
+    usados.add(nome.lower())
+    return nome
+
+
+def calcular_sha256(arquivo: str) -> str:
+    """SHA-256 do arquivo, lido em blocos"""
+    resumo = hashlib.sha256()
+    with open(arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def _dividir(df: pd.DataFrame, criterio: str, linhas_por_particao: int):
+    """Gera (valor, nome_arquivo, parte do DataFrame) na ordem das linhas"""
+    coluna = CRITERIOS_PARTICAO[criterio]
+
+    if coluna is None:
+        for numero, inicio in enumerate(range(0, len(df), linhas_por_particao)):
+            yield str(numero), f"parte_{numero:05d}.csv", df.iloc[inicio:inicio + linhas_por_particao]
+        return
+
+    if coluna in df:
+        valores = df[coluna].astype(object).fillna('').map(lambda valor: str(valor).strip() or VALOR_AUSENTE)
+    else:
+        valores = pd.Series(VALOR_AUSENTE, index=df.index)
+    # sort=False: as partições saem na ordem da primeira ocorrência e mantêm a ordem das linhas
+    usados = set()
+    for valor, parte in df.groupby(valores, sort=False):
+        yield valor, f"{criterio}={_nome_unico(valor, usados)}.csv", parte
+
+
+def _gravar_particao(parte: pd.DataFrame, caminho: str) -> Dict:
+    """Grava uma partição e calcula seu checksum (executado nas threads de gravação)"""
+    parte.to_csv(caminho, index=False, encoding='utf-8-sig')
+    return {
+        'linhas': len(parte),
+        'bytes': os.path.getsize(caminho),
+        'sha256': calcular_sha256(caminho),
+    }
+
+
+def salvar_particionado(df: pd.DataFrame, diretorio: str, criterio: str = 'uf',
+                        linhas_por_particao: int = LINHAS_POR_PARTICAO,
+                        max_threads: Optional[int] = None) -> Dict:
+    """
+    Grava o DataFrame em partições no diretório, em paralelo, e escreve o manifesto
+    Retorna o manifesto
+    """
+    if criterio not in CRITERIOS_PARTICAO:
+        raise ValueError(
+            f"Critério de particionamento desconhecido: {criterio}. "
+            f"Critérios disponíveis: {', '.join(CRITERIOS_PARTICAO)}"
+        )
+    if linhas_por_particao < 1:
+        raise ValueError("linhas_por_particao deve ser maior que zero")
+
+    os.makedirs(diretorio, exist_ok=True)
+    if max_threads is None:
+        max_threads = min(8, os.cpu_count() or 1)
+
+    particoes = []
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        tarefas = []
+        for valor, nome, parte in _dividir(df, criterio, linhas_por_particao):
+            particoes.append({'arquivo': nome, 'valor': valor})
+            tarefas.append(executor.submit(_gravar_particao, parte, os.path.join(diretorio, nome)))
+        for particao, tarefa in zip(particoes, tarefas):
+            particao.update(tarefa.result())
+
+    manifesto = {
+        'criterio': criterio,
+        'colunas': list(df.columns),
+        'total_linhas': len(df),
+        'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'particoes': particoes,
+    }
+    # Gravado por último: um diretório sem manifesto indica gravação incompleta
+    caminho_manifesto = os.path.join(diretorio, ARQUIVO_MANIFESTO)
+    with open(caminho_manifesto + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(caminho_manifesto + '.tmp', caminho_manifesto)
+    return manifesto
+
+
+def ler_manifesto(diretorio: str) -> Dict:
+    """Lê o manifesto de um diretório de resultados particionados"""
+    with open(os.path.join(diretorio, ARQUIVO_MANIFESTO), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def selecionar_particoes(manifesto: Dict, valores: Optional[Iterable[str]] = None) -> List[Dict]:
+    """Entradas do manifesto cujos valores foram pedidos (todas, se valores for None)"""
+    if valores is None:
+        return list(manifesto['particoes'])
+    pedidos = {str(valor).strip().upper() for valor in valores}
+    return [
+        particao for particao in manifesto['particoes']
+        if particao['valor'].upper() in pedidos or _nome_particao(particao['valor']).upper() in pedidos
+    ]
+
+
+def carregar_particoes(diretorio: str, valores: Optional[Iterable[str]] = None,
+                       verificar: bool = True) -> pd.DataFrame:
+    """
+    Carrega apenas as partições pedidas (ex: valores=['SP', 'RJ'] com critério 'uf')
+    Com verificar=True, confere linhas e SHA-256 de cada partição com o manifesto
+    """
+    manifesto = ler_manifesto(diretorio)
+    selecionadas = selecionar_particoes(manifesto, valores)
+    partes = []
+
+    for particao in selecionadas:
+        caminho = os.path.join(diretorio, particao['arquivo'])
+        if verificar and calcular_sha256(caminho) != particao['sha256']:
+            raise ValueError(f"Checksum divergente na partição {particao['arquivo']}")
+        parte = pd.read_csv(caminho, encoding='utf-8-sig', dtype={'cnpj_limpo': str, 'cnpj_original': str})
+        if verificar and len(parte) != particao['linhas']:
+            raise ValueError(
+                f"Partição {particao['arquivo']} com {len(parte)} linhas; "
+                f"o manifesto indica {particao['linhas']}"
+            )
+        partes.append(parte)
+
+    if not partes:
+        return pd.DataFrame(columns=manifesto['colunas'])
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo de perfil para lotes (python main.py processar ... --profile)
+Mede cada etapa (processar_arquivo, salvar_resultados...) com até três ferramentas:
+- cpu: cProfile na thread principal e em cada estágio do pipeline
+- memoria: tracemalloc, com os maiores alocadores de cada etapa e o pico
+- amostragem: amostras periódicas das pilhas de todas as threads (tempo de relógio,
+  inclusive esperas de rede e de rate limit)
+Os relatórios são gravados ao lado do arquivo de saída do lote.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+MODOS_PERFIL = ('cpu', 'memoria', 'amostragem')
+
+# Quadros guardados por alocação: os relatórios agrupam por linha, e pilhas mais
+# profundas deixam o lote várias vezes mais lento
+QUADROS_TRACEMALLOC = 1
+
+# Linhas exibidas em cada ranking dos relatórios
+TOP_RELATORIO = 25
+
+
+def _descrever_quadro(quadro) -> str:
+    codigo = quadro.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{quadro.f_lineno})"
+
+
+class Perfilador:
+    """
+    Coleta perfis de CPU, memória e amostragem por etapa do lote
+    Uso: iniciar(), blocos 'with perfilador.etapa(nome)' e finalizar()
+    """
+
+    def __init__(self, prefixo: str, modos: Iterable[str] = MODOS_PERFIL,
+                 intervalo_amostragem: float = 0.01):
+        modos = tuple(modos)
+        desconhecidos = [modo for modo in modos if modo not in MODOS_PERFIL]
+        if desconhecidos:
+            raise ValueError(
+                f"Modo de perfil desconhecido: {', '.join(desconhecidos)}. "
+                f"Modos disponíveis: {', '.join(MODOS_PERFIL)}"
+            )
+        self.prefixo = prefixo
+        self.modos = modos
+        self.intervalo_amostragem = intervalo_amostragem
+        self._lock = threading.Lock()
+        self._etapa_atual = None
+        self._perfis_cpu: Dict[str, List[cProfile.Profile]] = {}
+        self._avisos_cpu: List[str] = []
+        self._memoria: Dict[str, Dict] = {}
+        self._amostras = Counter()
+        self._total_amostras = Counter()
+        self._tempos: Dict[str, float] = {}
+        self._parar = threading.Event()
+        self._amostrador = None
+
+    def iniciar(self):
+        """Liga o tracemalloc e o amostrador, conforme os modos escolhidos"""
+        if 'memoria' in self.modos and not tracemalloc.is_tracing():
+            tracemalloc.start(QUADROS_TRACEMALLOC)
+        if 'amostragem' in self.modos:
+            self._amostrador = threading.Thread(target=self._amostrar, name='perfil-amostragem',
+                                                daemon=True)
+            self._amostrador.start()
+
+    def _amostrar(self):
+        """Guarda periodicamente a pilha de cada thread, rotulada pela etapa atual"""
+        proprio = threading.get_ident()
+        while not self._parar.wait(self.intervalo_amostragem):
+            etapa = self._etapa_atual
+            if etapa is None:
+                continue
+            nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, quadro in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    pilha.append(_descrever_quadro(quadro))
+                    quadro = quadro.f_back
+                pilha.reverse()
+                self._amostras[(etapa, nomes.get(ident, str(ident)), tuple(pilha))] += 1
+            self._total_amostras[etapa] += 1
+
+    def _novo_perfil_cpu(self, etapa: str, descricao: str) -> Optional[cProfile.Profile]:
+        """Cria e liga um cProfile para a thread atual (None se não for possível)"""
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError as e:
+            # Versões recentes do Python permitem um único profiler ativo por vez
+            self._avisos_cpu.append(f"{descricao}: {str(e)}")
+            return None
+        with self._lock:
+            self._perfis_cpu.setdefault(etapa, []).append(perfil)
+        return perfil
+
+    @contextmanager
+    def etapa(self, nome: str):
+        """Mede o bloco como uma etapa; etapas aninhadas contam para a etapa externa"""
+        if self._etapa_atual is not None:
+            yield
+            return
+
+        self._etapa_atual = nome
+        inicio = time.perf_counter()
+        perfil = None
+        antes = None
+        if 'memoria' in self.modos:
+            tracemalloc.reset_peak()
+            antes = tracemalloc.take_snapshot()
+        if 'cpu' in self.modos:
+            perfil = self._novo_perfil_cpu(nome, f"{nome} (thread principal)")
+        try:
+            yield
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            self._tempos[nome] = self._tempos.get(nome, 0.0) + time.perf_counter() - inicio
+            if antes is not None:
+                depois = tracemalloc.take_snapshot()
+                atual, pico = tracemalloc.get_traced_memory()
+                self._memoria[nome] = {
+                    'diferencas': self._filtrar(depois).compare_to(self._filtrar(antes), 'lineno'),
+                    'atual': atual,
+                    'pico': pico,
+                }
+            self._etapa_atual = None
+
+    @contextmanager
+    def perfilar_thread(self, descricao: str):
+        """Perfil de CPU de uma thread de trabalho (ex: estágio do pipeline) na etapa atual"""
+        perfil = None
+        if 'cpu' in self.modos and self._etapa_atual is not None:
+            perfil = self._novo_perfil_cpu(self._etapa_atual, descricao)
+        try:
+            yield
+        finally:
+            if perfil is not None:
+                perfil.disable()
+
+    @staticmethod
+    def _filtrar(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+        """Remove do snapshot as alocações do próprio perfilador e do tracemalloc"""
+        return snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    def finalizar(self) -> List[str]:
+        """Para a coleta, grava os relatórios e retorna os caminhos gerados"""
+        self._parar.set()
+        if self._amostrador is not None:
+            self._amostrador.join()
+        if 'memoria' in self.modos and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        arquivos = []
+        if 'cpu' in self.modos:
+            arquivos.extend(self._relatorio_cpu())
+        if 'memoria' in self.modos:
+            arquivos.append(self._relatorio_memoria())
+        if 'amostragem' in self.modos:
+            arquivos.extend(self._relatorio_amostragem())
+        return arquivos
+
+    def _cabecalho(self, titulo: str) -> List[str]:
+        linhas = [titulo, "=" * len(titulo)]
+        for etapa, segundos in self._tempos.items():
+            linhas.append(f"Etapa {etapa}: {segundos:.2f}s")
+        linhas.append("")
+        return linhas
+
+    def _relatorio_cpu(self) -> List[str]:
+        """Texto com as funções mais caras por etapa e um .prof por etapa (snakeviz, pstats)"""
+        arquivos = []
+        linhas = self._cabecalho("Perfil de CPU (cProfile)")
+        linhas.extend(f"⚠ {aviso}" for aviso in self._avisos_cpu)
+
+        for etapa, perfis in self._perfis_cpu.items():
+            estatisticas = pstats.Stats(perfis[0])
+            for perfil in perfis[1:]:
+                estatisticas.add(perfil)
+            caminho_prof = f"{self.prefixo}_cpu_{etapa}.prof"
+            estatisticas.dump_stats(caminho_prof)
+            arquivos.append(caminho_prof)
+
+            for ordem in ('cumulative', 'tottime'):
+                texto = io.StringIO()
+                estatisticas.stream = texto
+                estatisticas.sort_stats(ordem).print_stats(TOP_RELATORIO)
+                linhas.append(f"--- {etapa}: {len(perfis)} thread(s), ordenado por {ordem} ---")
+                linhas.append(texto.getvalue())
+
+        caminho = f"{self.prefixo}_cpu.txt"
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write("\n".join(linhas))
+        return [caminho] + arquivos
+
+    def _relatorio_memoria(self) -> str:
+        """Maiores alocadores (crescimento líquido) e pico de memória por etapa"""
+        linhas = self._cabecalho("Perfil de memória (tracemalloc)")
+        for etapa, dados in self._memoria.items():
+            linhas.append(f"--- {etapa} ---")
+            linhas.append(f"Pico: {dados['pico'] / 1048576:.1f} MiB | "
+                          f"ao final: {dados['atual'] / 1048576:.1f} MiB")
+            linhas.append("Maiores alocadores (crescimento durante a etapa):")
+            for diferenca in dados['diferencas'][:TOP_RELATORIO]:
+                quadro = diferenca.traceback[0]
+                linhas.append(
+                    f"  {diferenca.size_diff / 1024:+10.1f} KiB {diferenca.count_diff:+8d} blocos  "
+                    f"{quadro.filename}:{quadro.lineno}"
+                )
+            linhas.append("")
+
+        caminho = f"{self.prefixo}_memoria.txt"
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write("\n".join(linhas))
+        return caminho
+
+    def _relatorio_amostragem(self) -> List[str]:
+        """Funções mais frequentes nas amostras por etapa e pilhas no formato 'folded'"""
+        linhas = self._cabecalho("Perfil por amostragem (tempo de relógio)")
+        proprias = Counter()
+        inclusivas = Counter()
+        por_thread = Counter()
+        for (etapa, thread, pilha), quantidade in self._amostras.items():
+            por_thread[(etapa, thread)] += quantidade
+            if pilha:
+                proprias[(etapa, pilha[-1])] += quantidade
+            for funcao in set(pilha):
+                inclusivas[(etapa, funcao)] += quantidade
+
+        for etapa, total in self._total_amostras.items():
+            linhas.append(f"--- {etapa}: {total} amostras a cada {self.intervalo_amostragem * 1000:.0f}ms ---")
+            linhas.append("Amostras por thread:")
+            for (etapa_thread, thread), quantidade in por_thread.most_common():
+                if etapa_thread == etapa:
+                    linhas.append(f"  {quantidade:8d}  {thread}")
+            for titulo, contagem in (("No topo da pilha (tempo próprio):", proprias),
+                                     ("Na pilha (tempo inclusivo):", inclusivas)):
+                linhas.append(titulo)
+                itens = [(funcao, quantidade) for (etapa_funcao, funcao), quantidade
+                         in contagem.most_common() if etapa_funcao == etapa]
+                for funcao, quantidade in itens[:TOP_RELATORIO]:
+                    linhas.append(f"  {quantidade:8d}  {funcao}")
+            linhas.append("")
+
+        caminho = f"{self.prefixo}_amostras.txt"
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write("\n".join(linhas))
+
+        # Formato aceito por flamegraph.pl e speedscope
+        caminho_folded = f"{self.prefixo}_amostras.folded"
+        with open(caminho_folded, 'w', encoding='utf-8') as f:
+            for (etapa, thread, pilha), quantidade in self._amostras.items():
+                f.write(";".join((etapa, thread) + pilha) + f" {quantidade}\n")
+        return [caminho, caminho_folded]
+
+
+def prefixo_relatorios(arquivo_saida: str) -> str:
+    """Prefixo dos relatórios de perfil ao lado do arquivo (ou diretório) de saída"""
+    return os.path.splitext(arquivo_saida.rstrip(os.sep))[0] + '.perfil'
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline em estágios para processamento em lote
+Leitura, normalização/validação, consulta e escrita rodam em threads ligadas
+por filas limitadas. Enquanto o estágio de consulta aguarda o rate limit,
+os demais estágios continuam lendo, validando e gravando resultados.
+O uso de memória fica limitado pelo tamanho das filas.
+As mensagens por linha só vão ao console com consultor.verboso; caso
+contrário, uma linha de progresso ao vivo as substitui.
+"""
+
+import queue
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+from eventos import ProgressoAoVivo
+
+# Marca o fim do fluxo em cada fila
+_FIM = object()
+
+
+class PipelineConsulta:
+    """
+    Executa leitor -> normalizador -> consultor -> escritor em threads
+    A ordem original das linhas é preservada na saída
+    """
+
+    def __init__(self, consultor, tamanho_fila: int = 100):
+        self.consultor = consultor
+        self.tamanho_fila = tamanho_fila
+        self._parar = threading.Event()
+        self._erros = []
+        self._total = None
+        self.estatisticas = {'processados': 0, 'validos': 0, 'invalidos': 0}
+
+    def interromper(self):
+        """Solicita a parada do pipeline; as linhas já consultadas ainda são escritas"""
+        self._parar.set()
+
+    def executar(self, valores: Iterable, consumidor: Callable[[Dict], None],
+                 total: Optional[int] = None) -> Dict:
+        """
+        Processa os valores de CNPJ e entrega cada resultado ao consumidor, em ordem
+        Retorna as estatísticas do processamento
+        """
+        self._total = total
+        fila_leitura = queue.Queue(maxsize=self.tamanho_fila)
+        fila_consulta = queue.Queue(maxsize=self.tamanho_fila)
+        fila_escrita = queue.Queue(maxsize=self.tamanho_fila)
+        estatisticas = self.estatisticas
+
+        estagios = [
+            threading.Thread(target=self._estagio, name='leitor',
+                             args=(self._ler, valores, fila_leitura)),
+            threading.Thread(target=self._estagio, name='normalizador',
+                             args=(self._normalizar, fila_leitura, fila_consulta)),
+            threading.Thread(target=self._estagio, name='consultor',
+                             args=(self._consultar, fila_consulta, fila_escrita)),
+            threading.Thread(target=self._estagio, name='escritor',
+                             args=(self._escrever, fila_escrita, (consumidor, estatisticas))),
+        ]
+        # A espera do rate limit termina assim que o pipeline é interrompido
+        parada_anterior = self.consultor.parada
+        self.consultor.parada = self._parar
+        eventos = self.consultor.eventos
+        console_anterior = eventos.console
+        eventos.console = self.consultor.verboso
+        progresso = None if self.consultor.verboso else ProgressoAoVivo(eventos, total)
+        if progresso is not None:
+            progresso.iniciar()
+
+        for estagio in estagios:
+            estagio.daemon = True
+            estagio.start()
+
+        try:
+            # join com timeout para que o KeyboardInterrupt chegue à thread principal
+            for estagio in estagios:
+                while estagio.is_alive():
+                    estagio.join(0.2)
+        except KeyboardInterrupt:
+            self.interromper()
+            estagios[-1].join()
+            raise
+        finally:
+            if progresso is not None:
+                progresso.parar()
+            eventos.console = console_anterior
+            self.consultor.parada = parada_anterior
+            if self._erros:
+                raise self._erros[0]
+
+        return estatisticas
+
+    def _estagio(self, funcao, entrada, saida):
+        """Executa um estágio registrando erros e liberando os demais em caso de falha"""
+        perfilador = self.consultor.perfilador
+        try:
+            if perfilador is None:
+                funcao(entrada, saida)
+            else:
+                with perfilador.perfilar_thread(threading.current_thread().name):
+                    funcao(entrada, saida)
+        except Exception as e:
+            self._erros.append(e)
+            self.interromper()
+
+    def _colocar(self, fila: queue.Queue, item) -> bool:
+        """Coloca um item na fila; desiste se o pipeline for interrompido"""
+        while not self._parar.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _finalizar(self, fila: queue.Queue):
+        """Envia o marcador de fim mesmo após uma interrupção"""
+        while True:
+            try:
+                fila.put(_FIM, timeout=0.1)
+                return
+            except queue.Full:
+                if self._parar.is_set():
+                    # O estágio seguinte pode ter parado; descarta um item para abrir espaço
+                    try:
+                        fila.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _itens(self, fila: queue.Queue):
+        """Itera sobre os itens de uma fila até o marcador de fim"""
+        while True:
+            item = fila.get()
+            if item is _FIM:
+                return
+            yield item
+
+    def _ler(self, valores, saida: queue.Queue):
+        try:
+            for indice, valor in enumerate(valores, 1):
+                if not self._colocar(saida, (indice, valor)):
+                    break
+        finally:
+            self._finalizar(saida)
+
+    def _normalizar(self, entrada: queue.Queue, saida: queue.Queue):
+        consultor = self.consultor
+        try:
+            for indice, valor in self._itens(entrada):
+                cnpj_str = str(valor).strip()
+                cnpj_limpo = consultor.normalizar_cnpj(cnpj_str)
+                item = (indice, cnpj_str, cnpj_limpo, consultor.validar_cnpj(cnpj_limpo))
+                if not self._colocar(saida, item):
+                    break
+        finally:
+            self._finalizar(saida)
+
+    def _consultar(self, entrada: queue.Queue, saida: queue.Queue):
+        consultor = self.consultor
+        try:
+            for indice, cnpj_str, cnpj_limpo, valido in self._itens(entrada):
+                if self._parar.is_set():
+                    break
+                consultor.eventos.debug('linha_iniciada', f"\nProcessando {indice}/{self._total or '?'}",
+                                        linha=indice)
+                resultado = consultor.montar_resultado(indice, cnpj_str, cnpj_limpo, valido)
+                if not self._colocar(saida, resultado):
+                    break
+        finally:
+            self._finalizar(saida)
+
+    def _escrever(self, entrada: queue.Queue, destino):
+        consumidor, estatisticas = destino
+        eventos = self.consultor.eventos
+        for resultado in self._itens(entrada):
+            estatisticas['processados'] += 1
+            if self.consultor.resultado_invalido(resultado):
+                estatisticas['invalidos'] += 1
+            else:
+                estatisticas['validos'] += 1
+            consumidor(resultado)
+            eventos.debug('linha_concluida', cnpj=resultado['cnpj_limpo'])
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planejamento (dry-run) de processamento em lote
+Lê o arquivo de entrada uma única vez e estima quantas consultas reais à API
+serão necessárias e quanto tempo o lote vai levar, sem consultar a API
+"""
+
+import time
+from typing import Dict, Optional
+
+from leitores import iterar_cnpjs
+
+
+def formatar_duracao(segundos: float) -> str:
+    """Formata uma duração em segundos como '1d 02h 03m 04s'"""
+    segundos = int(round(segundos))
+    dias, resto = divmod(segundos, 86400)
+    horas, resto = divmod(resto, 3600)
+    minutos, segundos = divmod(resto, 60)
+
+    if dias:
+        return f"{dias}d {horas:02d}h {minutos:02d}m {segundos:02d}s"
+    if horas:
+        return f"{horas}h {minutos:02d}m {segundos:02d}s"
+    if minutos:
+        return f"{minutos}m {segundos:02d}s"
+    return f"{segundos}s"
+
+
+def planejar_arquivo(consultor, arquivo: str, coluna_cnpj: str = 'cnpj') -> Optional[Dict]:
+    """
+    Analisa o arquivo de entrada e retorna um dicionário com a estimativa do lote
+    Os CNPJs são guardados como inteiros para reduzir o uso de memória
+    """
+    inicio = time.time()
+
+    total_linhas = 0
+    invalidos = 0
+    duplicados = 0
+    mesma_empresa = 0
+    digitos_incorretos = 0
+    unicos = set()
+    rejeitados = set()
+    raizes = set()
+
+    try:
+        for valor in iterar_cnpjs(arquivo, coluna_cnpj):
+            total_linhas += 1
+
+            # Caminho rápido: a maioria das linhas já vem com 14 dígitos sem pontuação
+            if len(valor) == 14 and valor.isdigit():
+                cnpj_limpo = valor
+            else:
+                cnpj_limpo = consultor.normalizar_cnpj(valor)
+                if not consultor.validar_cnpj(cnpj_limpo):
+                    invalidos += 1
+                    continue
+            numero = int(cnpj_limpo)
+
+            if numero in unicos or numero in rejeitados:
+                duplicados += 1
+                continue
+
+            if not consultor.validar_digitos_cnpj(cnpj_limpo):
+                rejeitados.add(numero)
+                digitos_incorretos += 1
+                continue
+            unicos.add(numero)
+
+            # Os 8 primeiros dígitos (raiz) identificam a empresa; os demais, o estabelecimento
+            raiz = numero // 1000000
+            if raiz in raizes:
+                mesma_empresa += 1
+            else:
+                raizes.add(raiz)
+    except (OSError, ValueError) as e:
+        print(f"✗ Não foi possível planejar o arquivo {arquivo}: {str(e)}")
+        return None
+
+    acertos_cache = 0
+    negativos_cache = 0
+    # Na gravação o cache não é lido: todos os CNPJs únicos vão à API
+    if consultor.cache is not None and consultor.transporte.usa_cache and unicos:
+        acertos_cache = len(consultor.cache.filtrar_presentes(
+            f"{numero:014d}" for numero in unicos
+        ))
+        negativos_cache = len(consultor.cache.filtrar_negativos(
+            f"{numero:014d}" for numero in unicos
+        ))
+
+    chamadas_api = len(unicos) - acertos_cache - negativos_cache
+    intervalo = consultor.intervalo_efetivo()
+
+    return {
+        'arquivo': arquivo,
+        'total_linhas': total_linhas,
+        'invalidos': invalidos,
+        'duplicados': duplicados,
+        'cnpjs_unicos': len(unicos),
+        'digitos_incorretos': digitos_incorretos,
+        'empresas_distintas': len(raizes),
+        'filiais_mesma_empresa': mesma_empresa,
+        'acertos_cache': acertos_cache,
+        'negativos_cache': negativos_cache,
+        'chamadas_api': chamadas_api,
+        'intervalo_segundos': intervalo,
+        'tempo_estimado_segundos': chamadas_api * intervalo,
+        'tempo_planejamento_segundos': time.time() - inicio,
+    }
+
+
+def exibir_plano(plano: Dict):
+    """Exibe o resultado de planejar_arquivo() no console"""
+    print("\n" + "=" * 50)
+    print("PLANO DE PROCESSAMENTO (nenhuma consulta realizada)")
+    print("=" * 50)
+    print(f"Arquivo: {plano['arquivo']}")
+    print(f"Linhas lidas: {plano['total_linhas']}")
+    print(f"CNPJs inválidos (serão pulados): {plano['invalidos']}")
+    print(f"Linhas duplicadas: {plano['duplicados']}")
+    print(f"Dígitos verificadores incorretos (serão pulados): {plano['digitos_incorretos']}")
+    print(f"CNPJs únicos válidos: {plano['cnpjs_unicos']}")
+    print(f"Empresas distintas (raiz do CNPJ): {plano['empresas_distintas']}")
+    print(f"Filiais de empresas já presentes no arquivo: {plano['filiais_mesma_empresa']}")
+    print(f"Encontrados no cache: {plano['acertos_cache']}")
+    print(f"Conhecidos como não encontrados (cache negativo): {plano['negativos_cache']}")
+    print("-" * 50)
+    print(f"Consultas reais à API necessárias: {plano['chamadas_api']}")
+    print(f"Intervalo entre consultas: {plano['intervalo_segundos']:.1f}s")
+    print(f"Tempo estimado: {formatar_duracao(plano['tempo_estimado_segundos'])}")
+    print(f"(planejamento concluído em {plano['tempo_planejamento_segundos']:.2f}s)")
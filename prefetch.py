@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prefetch em segundo plano para manter o cache aquecido
+Consulta, com prioridade baixa, os CNPJs de uma lista de observação (por
+exemplo, todas as entradas de lotes anteriores) cujo cache está ausente ou
+prestes a expirar. Usa o mesmo limitador compartilhado dos lotes e da consulta
+interativa e cede a vez sempre que outro processo precisa da quota.
+"""
+
+import os
+import time
+from typing import Iterable, List, Optional
+
+from eventos import ProgressoAoVivo
+from leitores import iterar_cnpjs
+from limitador import PRIORIDADE_FUNDO
+
+
+class PrefetchCNPJ:
+    """
+    Mantém atualizadas no cache as entradas de uma lista de CNPJs observados
+    """
+
+    def __init__(self, consultor, renovar_apos_dias: float = 20):
+        if consultor.cache is None or consultor.limitador is None:
+            raise ValueError("O prefetch requer um consultor com cache e limitador compartilhado")
+        self.consultor = consultor
+        self.consultor.prioridade = PRIORIDADE_FUNDO
+        self.renovar_apos_segundos = renovar_apos_dias * 86400
+        self.observados = set()
+
+    def carregar_lista(self, arquivos: Iterable[str], coluna_cnpj: str = 'cnpj') -> int:
+        """
+        Adiciona à lista de observação os CNPJs válidos dos arquivos informados
+        Retorna o total de CNPJs observados
+        """
+        consultor = self.consultor
+        for arquivo in arquivos:
+            try:
+                for valor in iterar_cnpjs(arquivo, coluna_cnpj):
+                    cnpj_limpo = consultor.normalizar_cnpj(valor)
+                    if consultor.validar_digitos_cnpj(cnpj_limpo):
+                        self.observados.add(int(cnpj_limpo))
+            except (OSError, ValueError) as e:
+                print(f"⚠ Arquivo ignorado na lista de observação ({arquivo}): {str(e)}")
+        return len(self.observados)
+
+    def pendentes(self) -> List[str]:
+        """CNPJs observados sem cache recente e fora do cache negativo"""
+        cache = self.consultor.cache
+        cnpjs = [f"{numero:014d}" for numero in sorted(self.observados)]
+        atualizados = cache.filtrar_atualizados(cnpjs, self.renovar_apos_segundos)
+        negativos = cache.filtrar_negativos(cnpjs)
+        return [cnpj for cnpj in cnpjs if cnpj not in atualizados and cnpj not in negativos]
+
+    def executar(self, ciclos: Optional[int] = None, pausa_segundos: float = 300):
+        """
+        Renova as entradas pendentes; repete a cada pausa_segundos
+        Com ciclos=None, roda até ser interrompido (Ctrl+C)
+        """
+        consultor = self.consultor
+        ciclo = 0
+
+        try:
+            # Roda com prioridade baixa também no sistema operacional, quando disponível
+            if hasattr(os, 'nice'):
+                os.nice(10)
+        except OSError:
+            pass
+
+        # Como nos lotes, as mensagens por linha só vão ao console com verboso
+        eventos = consultor.eventos
+        console_anterior = eventos.console
+        eventos.console = consultor.verboso
+        progresso = None
+
+        try:
+            while ciclos is None or ciclo < ciclos:
+                ciclo += 1
+                pendentes = self.pendentes()
+                eventos.info('prefetch_ciclo',
+                             f"\n[prefetch] Ciclo {ciclo}: {len(pendentes)} de {len(self.observados)} CNPJs a renovar",
+                             ciclo=ciclo, pendentes=len(pendentes), observados=len(self.observados))
+                progresso = None if consultor.verboso else ProgressoAoVivo(eventos, len(pendentes))
+                if progresso is not None:
+                    progresso.iniciar()
+
+                for i, cnpj in enumerate(pendentes, 1):
+                    # O limitador só libera a vaga quando nenhuma sessão de maior prioridade está ativa
+                    dados, motivo = consultor.consultar_cnpj_detalhado(cnpj, forcar_atualizacao=True)
+                    if dados is None:
+                        eventos.aviso('prefetch_falha', f"[prefetch] {i}/{len(pendentes)} {cnpj}: {motivo}",
+                                      cnpj=cnpj, motivo=motivo)
+                    eventos.debug('linha_concluida', cnpj=cnpj)
+
+                if progresso is not None:
+                    progresso.parar()
+                    progresso = None
+                consultor.cache.sincronizar()
+                if ciclos is not None and ciclo >= ciclos:
+                    break
+                # Libera a sessão durante a pausa para não aparecer como ativa
+                consultor.encerrar_sessao()
+                time.sleep(pausa_segundos)
+        except KeyboardInterrupt:
+            eventos.aviso('prefetch_interrompido', "\n[prefetch] Interrompido pelo usuário", ciclo=ciclo)
+        finally:
+            if progresso is not None:
+                progresso.parar()
+            eventos.console = console_anterior
+            consultor.cache.sincronizar()
+            consultor.encerrar_sessao()
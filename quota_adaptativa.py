@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quota adaptativa (AIMD) para a API de CNPJ
+Em vez de um limite fixo de consultas por minuto, o controlador aprende o
+limite real do provedor a partir das respostas:
+- partida: enquanto não houve sinal de congestionamento, a taxa dobra a cada
+  janela de respostas saudáveis (até o último limite observado)
+- depois, a taxa sobe um passo fixo por janela saudável (aumento aditivo)
+- 429, erros 5xx, timeouts e falhas de conexão reduzem a taxa por um fator
+  (redução multiplicativa); latência crescente reduz a taxa de forma mais suave
+A última taxa segura de cada provedor é gravada em quota_aprendida.json, e o
+próximo lote começa por ela.
+"""
+
+import json
+import os
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional
+
+ARQUIVO_QUOTA = 'quota_aprendida.json'
+
+# Taxa usada quando o provedor ainda não tem limite aprendido (o antigo limite fixo)
+TAXA_INICIAL = 5.0
+
+# Respostas consideradas sinal de congestionamento (além de timeouts e falhas de conexão)
+STATUS_LIMITE = 429
+
+# Só aumenta a taxa se a vazão da janela chegou a essa fração dela; abaixo disso o
+# lote não está usando a taxa atual (cache, latência) e ela não foi de fato testada
+USO_MINIMO_PARA_AUMENTO = 0.8
+
+
+def _congestionamento(status: Optional[int]) -> bool:
+    return status is None or status == STATUS_LIMITE or status >= 500
+
+
+class ControladorQuota:
+    """
+    Controla a taxa de consultas por minuto de um provedor com aumento aditivo
+    e redução multiplicativa; o consultor usa intervalo() entre as consultas e
+    informa cada resposta em registrar()
+    """
+
+    def __init__(self, provedor: str = 'brasilapi', arquivo: Optional[str] = ARQUIVO_QUOTA,
+                 taxa_inicial: float = TAXA_INICIAL, taxa_minima: float = 1.0,
+                 taxa_maxima: float = 600.0, aumento: float = 1.0, fator_reducao: float = 0.7,
+                 fator_latencia: float = 0.9, respostas_por_janela: int = 10,
+                 carencia_segundos: float = 60.0, limiar_latencia: float = 2.0,
+                 folga_latencia_ms: float = 100.0):
+        self.provedor = provedor
+        self.arquivo = arquivo
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima
+        self.aumento = aumento
+        self.fator_reducao = fator_reducao
+        self.fator_latencia = fator_latencia
+        self.respostas_por_janela = respostas_por_janela
+        # Erros logo após uma redução refletem a taxa anterior (a janela do provedor
+        # ainda está cheia) e não reduzem de novo
+        self.carencia_segundos = carencia_segundos
+        self.limiar_latencia = limiar_latencia
+        self.folga_latencia_ms = folga_latencia_ms
+        self._lock = threading.Lock()
+        self._janela: List[float] = []
+        self._inicio_janela = None
+        self._ultima_vazao = None
+        self._latencia_base = None
+        self._ultima_reducao = None
+        self.partida = True
+
+        aprendido = self._ler_arquivo().get(provedor, {})
+        self.limite_observado = aprendido.get('limite_observado')
+        self.taxa_segura = self._limitar(aprendido.get('taxa_segura', taxa_inicial))
+        self.taxa = self.taxa_segura
+        if self.limite_observado is not None and self.taxa * 2 > self.limite_observado:
+            # Já começa perto do limite conhecido: sobe só em passos aditivos
+            self.partida = False
+
+    def _limitar(self, taxa: float) -> float:
+        return min(max(taxa, self.taxa_minima), self.taxa_maxima)
+
+    def intervalo(self) -> float:
+        """Intervalo em segundos entre consultas na taxa atual"""
+        return 60 / self.taxa
+
+    def registrar(self, status: Optional[int], duracao_ms: float) -> Optional[str]:
+        """
+        Informa o resultado de uma consulta (status None = timeout ou falha de conexão)
+        Retorna o motivo do ajuste ('aumento', 'erro', 'latencia') ou None se a taxa não mudou
+        """
+        agora = time.monotonic()
+        with self._lock:
+            if _congestionamento(status):
+                self._janela = []
+                self._inicio_janela = agora
+                return self._reduzir_por_erro(agora)
+
+            if self._inicio_janela is None:
+                # Primeira resposta: a vazão é medida a partir daqui
+                self._inicio_janela = agora
+                return None
+            self._janela.append(duracao_ms)
+            if len(self._janela) < self.respostas_por_janela:
+                return None
+            mediana = statistics.median(self._janela)
+            vazao = len(self._janela) * 60 / max(agora - self._inicio_janela, 1e-6)
+            self._ultima_vazao = vazao
+            self._janela = []
+            self._inicio_janela = agora
+
+            if self._latencia_base is None or mediana < self._latencia_base:
+                self._latencia_base = mediana
+            elif (mediana > self._latencia_base * self.limiar_latencia
+                  and mediana - self._latencia_base > self.folga_latencia_ms):
+                self.partida = False
+                # A próxima janela define a nova referência: se a lentidão não vier da
+                # carga, a taxa não continua caindo indefinidamente
+                self._latencia_base = None
+                return self._ajustar(self.taxa * self.fator_latencia, 'latencia')
+
+            # Janela inteira saudável: a vazão alcançada está comprovada
+            anterior = self.taxa_segura
+            self.taxa_segura = max(self.taxa_segura, min(self.taxa, vazao))
+            if vazao < self.taxa * USO_MINIMO_PARA_AUMENTO:
+                if self.taxa_segura != anterior:
+                    self.salvar()
+                return None
+            if self.partida:
+                nova = self.taxa * 2
+                if self.limite_observado is not None and nova >= self.limite_observado:
+                    self.partida = False
+                    nova = max(self.taxa + self.aumento, self.limite_observado * self.fator_reducao)
+            else:
+                nova = self.taxa + self.aumento
+            return self._ajustar(nova, 'aumento')
+
+    def _reduzir_por_erro(self, agora: float) -> Optional[str]:
+        if self._ultima_reducao is not None and agora - self._ultima_reducao < self.carencia_segundos:
+            return None
+        self._ultima_reducao = agora
+        self.partida = False
+        # Reduz a partir da vazão real, se ela estava abaixo da taxa permitida
+        base = min(self.taxa, self._ultima_vazao) if self._ultima_vazao else self.taxa
+        self.limite_observado = base
+        return self._ajustar(base * self.fator_reducao, 'erro')
+
+    def _ajustar(self, nova_taxa: float, motivo: str) -> Optional[str]:
+        nova_taxa = self._limitar(nova_taxa)
+        if nova_taxa < self.taxa_segura:
+            self.taxa_segura = nova_taxa
+        if nova_taxa == self.taxa and motivo == 'aumento':
+            return None
+        self.taxa = nova_taxa
+        self.salvar()
+        return motivo
+
+    def _ler_arquivo(self) -> Dict:
+        if not self.arquivo or not os.path.exists(self.arquivo):
+            return {}
+        try:
+            with open(self.arquivo, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Arquivo corrompido: recomeça pela taxa inicial
+            return {}
+
+    def salvar(self):
+        """Grava a taxa segura e o limite observado do provedor, preservando os demais"""
+        if not self.arquivo:
+            return
+        dados = self._ler_arquivo()
+        dados[self.provedor] = {
+            'taxa_segura': round(self.taxa_segura, 3),
+            'limite_observado': round(self.limite_observado, 3) if self.limite_observado else None,
+            'atualizado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        temporario = f"{self.arquivo}.{os.getpid()}.tmp"
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(dados, f, ensure_ascii=False, indent=2)
+            os.replace(temporario, self.arquivo)
+        except OSError:
+            # Não gravar o aprendizado não deve interromper o lote
+            pass
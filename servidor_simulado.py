@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita a Brasil API com um limite de consultas oculto
+Usado para validar a quota adaptativa sem consumir a API real:
+- GET /api/cnpj/v1/<cnpj> responde um JSON com dados fictícios
+- acima de 'limite' consultas na janela deslizante de 'janela' segundos, responde 429
+- a latência cresce à medida que a janela se aproxima do limite
+
+Uso: python servidor_simulado.py --limite 30 --janela 10 --porta 8765
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIXO = '/api/cnpj/v1/'
+
+# Uso da janela a partir do qual a latência começa a crescer
+INICIO_LATENCIA_CARGA = 0.7
+
+
+class ServidorSimulado:
+    """Servidor HTTP em uma thread; url_base aponta para o endpoint de CNPJ"""
+
+    def __init__(self, limite: int, janela: float = 60.0, porta: int = 0,
+                 latencia_ms: float = 20.0, latencia_carga_ms: float = 150.0):
+        self.limite = limite
+        self.janela = janela
+        self.latencia_ms = latencia_ms
+        self.latencia_carga_ms = latencia_carga_ms
+        self.contadores = {'respondidas': 0, 'limitadas': 0}
+        self._aceitas = deque()
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', porta), self._tratador())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def limite_por_minuto(self) -> float:
+        return self.limite * 60 / self.janela
+
+    @property
+    def url_base(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}{PREFIXO.rstrip('/')}"
+
+    def _admitir(self):
+        """Retorna (aceita, uso da janela) e registra a consulta aceita"""
+        agora = time.monotonic()
+        with self._lock:
+            while self._aceitas and agora - self._aceitas[0] >= self.janela:
+                self._aceitas.popleft()
+            if len(self._aceitas) >= self.limite:
+                self.contadores['limitadas'] += 1
+                return False, 1.0
+            self._aceitas.append(agora)
+            self.contadores['respondidas'] += 1
+            return True, len(self._aceitas) / self.limite
+
+    def _tratador(self):
+        servidor = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith(PREFIXO):
+                    self._responder(404, {'message': 'Rota inexistente'})
+                    return
+                cnpj = self.path[len(PREFIXO):]
+                aceita, uso = servidor._admitir()
+                carga = max(0.0, (uso - INICIO_LATENCIA_CARGA) / (1 - INICIO_LATENCIA_CARGA))
+                time.sleep((servidor.latencia_ms + servidor.latencia_carga_ms * carga) / 1000)
+                if not aceita:
+                    self._responder(429, {'message': 'Too Many Requests'})
+                    return
+                self._responder(200, {
+                    'cnpj': cnpj,
+                    'razao_social': f'EMPRESA SIMULADA {cnpj[:8]}',
+                    'nome_fantasia': '',
+                    'porte': 'MICRO EMPRESA',
+                    'codigo_porte': 1,
+                    'uf': 'SP',
+                    'municipio': 'SAO PAULO',
+                    'descricao_situacao_cadastral': 'ATIVA',
+                    'natureza_juridica': 'Sociedade Empresária Limitada',
+                    'cnae_fiscal': 6201501,
+                    'cnae_fiscal_descricao': 'Desenvolvimento de programas de computador sob encomenda',
+                })
+
+            def _responder(self, status, corpo):
+                conteudo = json.dumps(corpo).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(conteudo)))
+                self.end_headers()
+                self.wfile.write(conteudo)
+
+            def log_message(self, formato, *args):
+                pass  # sem uma linha no console por requisição
+
+        return Tratador
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever,
+                                        name='servidor-simulado', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Brasil API simulada com limite oculto")
+    parser.add_argument('--limite', type=int, default=30, help="Consultas aceitas por janela (padrão: 30)")
+    parser.add_argument('--janela', type=float, default=60, help="Janela deslizante em segundos (padrão: 60)")
+    parser.add_argument('--porta', type=int, default=8765, help="Porta local (padrão: 8765)")
+    parser.add_argument('--latencia-ms', type=float, default=20, help="Latência sem carga (padrão: 20)")
+    parser.add_argument('--latencia-carga-ms', type=float, default=150,
+                        help="Latência adicional com a janela cheia (padrão: 150)")
+    args = parser.parse_args()
+
+    servidor = ServidorSimulado(args.limite, args.janela, args.porta,
+                                args.latencia_ms, args.latencia_carga_ms)
+    servidor.iniciar()
+    print(f"Servidor simulado em {servidor.url_base} "
+          f"(limite oculto: {servidor.limite_por_minuto:.0f} consultas/min)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        servidor.parar()
+        print(f"\nRespondidas: {servidor.contadores['respondidas']} | "
+              f"limitadas (429): {servidor.contadores['limitadas']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tabelas de referência para descrições repetidas nas respostas da Brasil API
+Campos como cnae_fiscal_descricao, natureza_juridica e descricao_situacao_cadastral
+se repetem em milhares de registros. Cada valor distinto é guardado uma única vez
+em uma tabela compartilhada e os registros passam a guardar apenas o código
+inteiro; a descrição só é resolvida quando o campo é lido (ao gerar a saída).
+"""
+
+import threading
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Campos das respostas da API codificados nas tabelas de referência
+CAMPOS_REFERENCIA = ('cnae_fiscal_descricao', 'natureza_juridica', 'descricao_situacao_cadastral')
+
+
+class TabelasReferencia:
+    """
+    Tabelas campo -> lista de valores, em que o código de um valor é sua posição
+    Por padrão os códigos são atribuídos em memória; o cache pode informar
+    funções para atribuir e recarregar os códigos a partir do seu banco, de
+    forma que os códigos gravados sejam os mesmos em todos os processos.
+    """
+
+    def __init__(self, registrar: Optional[Callable[[str, str], int]] = None,
+                 carregar: Optional[Callable[[], Iterable[Tuple[str, int, str]]]] = None):
+        self._registrar = registrar
+        self._carregar = carregar
+        self._lock = threading.Lock()
+        self._valores = {campo: [] for campo in CAMPOS_REFERENCIA}
+        self._codigos = {campo: {} for campo in CAMPOS_REFERENCIA}
+        if carregar is not None:
+            self._recarregar()
+
+    def _recarregar(self):
+        """Lê do banco os códigos atribuídos (inclusive por outros processos)"""
+        for campo, codigo, valor in self._carregar():
+            self._incluir(campo, codigo, valor)
+
+    def _incluir(self, campo: str, codigo: int, valor: str):
+        valores = self._valores[campo]
+        if codigo >= len(valores):
+            valores.extend([None] * (codigo + 1 - len(valores)))
+        valores[codigo] = valor
+        self._codigos[campo][valor] = codigo
+
+    def codificar(self, campo: str, valor: str) -> int:
+        """Retorna o código do valor no campo, atribuindo um novo se necessário"""
+        codigo = self._codigos[campo].get(valor)
+        if codigo is not None:
+            return codigo
+        with self._lock:
+            codigo = self._codigos[campo].get(valor)
+            if codigo is None:
+                if self._registrar is not None:
+                    codigo = self._registrar(campo, valor)
+                else:
+                    codigo = len(self._valores[campo])
+                self._incluir(campo, codigo, valor)
+            return codigo
+
+    def resolver(self, campo: str, codigo: int) -> str:
+        """Retorna a descrição correspondente ao código"""
+        valores = self._valores[campo]
+        if codigo < len(valores) and valores[codigo] is not None:
+            return valores[codigo]
+        # Código atribuído por outro processo depois da última leitura do banco
+        with self._lock:
+            if self._carregar is not None:
+                self._recarregar()
+            valor = valores[codigo] if codigo < len(valores) else None
+        if valor is None:
+            raise KeyError(f"Código {codigo} desconhecido na tabela de referência '{campo}'")
+        return valor
+
+    def valores(self, campo: str, maior_codigo: int = -1) -> List[str]:
+        """
+        Cópia da tabela do campo (posição = código), para montar colunas categóricas
+        Garante que todos os códigos até maior_codigo estejam presentes
+        """
+        with self._lock:
+            valores = self._valores[campo]
+            if self._carregar is not None and (maior_codigo >= len(valores) or None in valores):
+                self._recarregar()
+            if maior_codigo >= len(valores) or None in valores:
+                raise KeyError(f"Tabela de referência '{campo}' incompleta")
+            return list(valores)
+
+    def compactar(self, dados) -> 'DadosCompactos':
+        """Substitui os campos de referência de uma resposta da API pelos seus códigos"""
+        if isinstance(dados, DadosCompactos) and dados.tabelas is self:
+            return dados
+        compactos = dict(dados)
+        for campo in CAMPOS_REFERENCIA:
+            valor = compactos.get(campo)
+            if isinstance(valor, str):
+                compactos[campo] = self.codificar(campo, valor)
+        return DadosCompactos(compactos, self)
+
+
+class DadosCompactos(Mapping):
+    """
+    Resposta da API com os campos de referência guardados como códigos
+    Comporta-se como um dicionário somente leitura: ler um campo de referência
+    devolve a descrição. Use compactos() para serializar sem as descrições.
+    """
+
+    __slots__ = ('_dados', 'tabelas')
+
+    def __init__(self, dados: Dict, tabelas: TabelasReferencia):
+        self._dados = dados
+        self.tabelas = tabelas
+
+    def __getitem__(self, chave):
+        valor = self._dados[chave]
+        # Só códigos são resolvidos: entradas antigas do cache trazem a descrição por extenso
+        if type(valor) is int and chave in CAMPOS_REFERENCIA:
+            return self.tabelas.resolver(chave, valor)
+        return valor
+
+    def __iter__(self) -> Iterator:
+        return iter(self._dados)
+
+    def __len__(self) -> int:
+        return len(self._dados)
+
+    def __repr__(self) -> str:
+        return f"DadosCompactos({dict(self)!r})"
+
+    def codigo(self, campo: str) -> Optional[int]:
+        """Código do campo de referência (None se o campo estiver ausente ou nulo)"""
+        valor = self._dados.get(campo)
+        if isinstance(valor, str):
+            return self.tabelas.codificar(campo, valor)
+        return valor
+
+    def compactos(self) -> Dict:
+        """Dicionário com os códigos no lugar das descrições (para gravação)"""
+        return self._dados
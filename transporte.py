@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Camada de transporte HTTP usada por ConsultorCNPJA
+- TransporteHTTP: requisições reais via requests
+- TransporteGravacao: faz a requisição real e grava o par URL/resposta
+- TransporteReproducao: responde a partir de uma gravação, sem rede e sem rate limit
+O arquivo de gravação é uma sequência de registros binários com corpo
+comprimido; o índice (URL -> posição) é reconstruído lendo só os cabeçalhos.
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Optional
+
+import requests
+
+# Cabeçalho de cada registro: tamanho da URL, status HTTP, tamanho do corpo comprimido
+CABECALHO = struct.Struct('<HHI')
+ASSINATURA = b'CNPJREC1'
+
+
+class RespostaTransporte:
+    """Resposta mínima compatível com o uso de requests.Response no consultor"""
+
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self) -> Dict:
+        return json.loads(self.content)
+
+
+class TransporteHTTP:
+    """Transporte real; respeita o rate limit da API"""
+
+    respeita_rate_limit = True
+    # Com False, o consultor não responde do cache local (toda consulta passa pelo transporte)
+    usa_cache = True
+
+    def __init__(self):
+        self._sessao = requests.Session()
+
+    def obter(self, url: str, timeout: float = 30) -> RespostaTransporte:
+        resposta = self._sessao.get(url, timeout=timeout)
+        return RespostaTransporte(resposta.status_code, resposta.content)
+
+    def fechar(self):
+        self._sessao.close()
+
+
+class TransporteGravacao(TransporteHTTP):
+    """
+    Faz as requisições reais e grava cada resposta no arquivo de gravação
+    Gravações anteriores no mesmo arquivo são preservadas (o arquivo só cresce)
+    O cache local não é lido: respostas vindas do cache não entrariam na gravação
+    e a reprodução do mesmo lote falharia nessas linhas
+    """
+
+    usa_cache = False
+
+    def __init__(self, arquivo: str):
+        super().__init__()
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        novo = not os.path.exists(arquivo) or os.path.getsize(arquivo) == 0
+        self._saida = open(arquivo, 'ab')
+        if novo:
+            self._saida.write(ASSINATURA)
+            self._saida.flush()
+
+    def obter(self, url: str, timeout: float = 30) -> RespostaTransporte:
+        resposta = super().obter(url, timeout)
+        url_bytes = url.encode('utf-8')
+        corpo = zlib.compress(resposta.content, 6)
+        with self._lock:
+            self._saida.write(CABECALHO.pack(len(url_bytes), resposta.status_code, len(corpo)))
+            self._saida.write(url_bytes)
+            self._saida.write(corpo)
+            self._saida.flush()
+        return resposta
+
+    def fechar(self):
+        super().fechar()
+        with self._lock:
+            self._saida.close()
+
+
+class TransporteReproducao:
+    """
+    Responde às requisições a partir de uma gravação, de forma determinística
+    Não usa a rede nem o rate limit; URLs não gravadas levantam RequestException
+    """
+
+    respeita_rate_limit = False
+    usa_cache = False
+
+    def __init__(self, arquivo: str):
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        self._entrada = open(arquivo, 'rb')
+        if self._entrada.read(len(ASSINATURA)) != ASSINATURA:
+            raise ValueError(f"Arquivo de gravação inválido: {arquivo}")
+        self._indice = self._indexar()
+
+    def _indexar(self) -> Dict[str, tuple]:
+        """Lê apenas os cabeçalhos e guarda a posição do último registro de cada URL"""
+        indice = {}
+        tamanho_arquivo = os.fstat(self._entrada.fileno()).st_size
+        posicao = len(ASSINATURA)
+
+        while posicao + CABECALHO.size <= tamanho_arquivo:
+            self._entrada.seek(posicao)
+            tamanho_url, status, tamanho_corpo = CABECALHO.unpack(self._entrada.read(CABECALHO.size))
+            fim = posicao + CABECALHO.size + tamanho_url + tamanho_corpo
+            if fim > tamanho_arquivo:
+                break  # registro incompleto (gravação interrompida)
+            url = self._entrada.read(tamanho_url).decode('utf-8')
+            indice[url] = (status, posicao + CABECALHO.size + tamanho_url, tamanho_corpo)
+            posicao = fim
+
+        return indice
+
+    def __len__(self) -> int:
+        return len(self._indice)
+
+    def obter(self, url: str, timeout: float = 30) -> RespostaTransporte:
+        registro = self._indice.get(url)
+        if registro is None:
+            raise requests.exceptions.RequestException(f"Resposta não gravada para {url}")
+
+        status, posicao, tamanho = registro
+        with self._lock:
+            self._entrada.seek(posicao)
+            corpo = self._entrada.read(tamanho)
+        return RespostaTransporte(status, zlib.decompress(corpo))
+
+    def fechar(self):
+        with self._lock:
+            self._entrada.close()
+
+
+def criar_transporte(modo: Optional[str] = None, arquivo: Optional[str] = None):
+    """
+    Cria o transporte conforme o modo: None/'http', 'gravar' ou 'reproduzir'
+    Os modos 'gravar' e 'reproduzir' exigem o arquivo de gravação
+    """
+    if modo in (None, 'http'):
+        return TransporteHTTP()
+    if arquivo is None:
+        raise ValueError(f"O modo de transporte '{modo}' exige um arquivo de gravação")
+    if modo == 'gravar':
+        return TransporteGravacao(arquivo)
+    if modo == 'reproduzir':
+        return TransporteReproducao(arquivo)
+    raise ValueError(f"Modo de transporte desconhecido: {modo}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Validação da quota adaptativa contra o servidor simulado
+1. Um lote começa pela taxa inicial e aprende o limite oculto do servidor
+2. Um segundo lote começa pela taxa segura gravada pelo primeiro
+Aprovado se a taxa aprendida ficar entre 50% e 100% do limite oculto e o
+segundo lote quase não receber 429.
+
+Uso: python validar_quota.py --limite 20 --janela 5 --duracao 60
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from consultor_simples import ConsultorCNPJA, calcular_digitos_cnpj
+from eventos import RegistroEventos
+from quota_adaptativa import ControladorQuota
+from servidor_simulado import ServidorSimulado
+
+PROVEDOR = 'simulado'
+
+
+def gerar_cnpjs():
+    """Gera CNPJs com dígitos verificadores válidos (filial 0001)"""
+    numero = 10000000
+    while True:
+        base = f"{numero:08d}0001"
+        yield base + calcular_digitos_cnpj(base)
+        numero += 1
+
+
+def executar_lote(servidor: ServidorSimulado, arquivo_quota: str, args, duracao: float, titulo: str):
+    """Consulta CNPJs no servidor simulado por 'duracao' segundos; retorna (quota, respondidas, limitadas)"""
+    quota = ControladorQuota(PROVEDOR, arquivo_quota, taxa_inicial=args.taxa_inicial,
+                             aumento=args.aumento, respostas_por_janela=args.respostas_por_janela,
+                             carencia_segundos=servidor.janela)
+    consultor = ConsultorCNPJA(quota=quota)
+    consultor.base_url = servidor.url_base
+    consultor.eventos = RegistroEventos(console=False)
+
+    def exibir_ajuste(nivel, evento, campos):
+        if evento == 'quota_ajustada':
+            print(f"  {time.time() - inicio:6.1f}s  {campos['motivo']:<8} -> {campos['taxa']:.1f} consultas/min")
+    consultor.eventos.observar(exibir_ajuste)
+
+    print(f"\n{titulo}: começa em {quota.taxa:.1f} consultas/min")
+    respondidas = servidor.contadores['respondidas']
+    limitadas = servidor.contadores['limitadas']
+    inicio = time.time()
+    cnpjs = gerar_cnpjs()
+    while time.time() - inicio < duracao:
+        consultor.consultar_cnpj_detalhado(next(cnpjs))
+    consultor.transporte.fechar()
+
+    respondidas = servidor.contadores['respondidas'] - respondidas
+    limitadas = servidor.contadores['limitadas'] - limitadas
+    vazao = respondidas * 60 / (time.time() - inicio)
+    print(f"  Respondidas: {respondidas} ({vazao:.1f}/min) | limitadas (429): {limitadas} | "
+          f"taxa segura: {quota.taxa_segura:.1f}/min")
+    return quota, respondidas, limitadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valida a quota adaptativa com um limite oculto")
+    parser.add_argument('--limite', type=int, default=20, help="Consultas aceitas por janela no servidor")
+    parser.add_argument('--janela', type=float, default=5, help="Janela do servidor em segundos")
+    parser.add_argument('--duracao', type=float, default=60, help="Duração do primeiro lote em segundos")
+    parser.add_argument('--taxa-inicial', type=float, default=30, help="Taxa inicial (consultas/min)")
+    parser.add_argument('--aumento', type=float, default=10, help="Aumento aditivo por janela (consultas/min)")
+    parser.add_argument('--respostas-por-janela', type=int, default=5,
+                        help="Respostas saudáveis antes de cada aumento")
+    args = parser.parse_args()
+
+    servidor = ServidorSimulado(args.limite, args.janela)
+    servidor.iniciar()
+    limite = servidor.limite_por_minuto
+    print(f"Limite oculto do servidor: {limite:.0f} consultas/min")
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivo_quota = os.path.join(diretorio, 'quota_aprendida.json')
+        try:
+            primeiro, _, _ = executar_lote(servidor, arquivo_quota, args, args.duracao,
+                                           "Lote 1 (sem limite aprendido)")
+            segundo, respondidas, limitadas = executar_lote(servidor, arquivo_quota, args,
+                                                            args.duracao / 2,
+                                                            "Lote 2 (a partir da taxa gravada)")
+        finally:
+            servidor.parar()
+
+    verificacoes = [
+        (0.5 * limite <= primeiro.taxa_segura <= limite,
+         f"Taxa aprendida {primeiro.taxa_segura:.1f}/min entre 50% e 100% do limite"),
+        (segundo.taxa_segura >= 0.5 * limite,
+         f"Lote 2 mantém a taxa segura ({segundo.taxa_segura:.1f}/min)"),
+        (limitadas <= 0.1 * (respondidas + limitadas),
+         f"Lote 2 com {limitadas} respostas 429 em {respondidas + limitadas} consultas (até 10%)"),
+    ]
+    print()
+    for aprovado, descricao in verificacoes:
+        print(f"{'✓' if aprovado else '✗'} {descricao}")
+    return 0 if all(aprovado for aprovado, _ in verificacoes) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())